@@ -0,0 +1,38 @@
+# mb124ac - shared modules for the Mercedes-Benz 124 A/C (SA 580) data stream tools
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Importing the package imports none of its modules, they are imported
+# on first use, eg. mb124ac.fields after "import mb124ac", or with
+# "from mb124ac import fields". No module has side effects on import,
+# and only ui.py (the decoder display) imports curses. pyserial is
+# imported only when a serial line is opened.
+
+import importlib
+
+modules = ("archive", "compare", "derived", "events", "export", "fields", "framing", "history", "index", "ingest",
+           "logwriter", "profiling", "publish", "pyramid", "query", "replay", "serialreader", "stats", "synth",
+           "timestamps", "transitions", "ui", "units")
+
+
+def __getattr__(name):
+    if name in modules:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# EOF
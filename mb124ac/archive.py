@@ -0,0 +1,332 @@
+# archive.py - delta-encoded capture archives of Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Most bytes of a packet repeat the previous packet, so an archive
+# stores the packets of a capture in chunks of chunk_len packets, each
+# with the first packet in full (the keyframe) and after it, column by
+# column, only the packets where the byte changes and the new value.
+# The bytes between packets are stored as well, so a capture converted
+# to an archive and back is identical to the original.
+
+# Every chunk is compressed on its own with zlib or lzma and listed in
+# an index at the end of the file, so a single chunk can be read
+# without touching the rest.
+
+# File layout, little-endian:
+#   header   8 bytes magic "MB124AR1", uint8 compression, 3 bytes
+#            padding, uint32 chunk_len
+#   chunks   compressed chunk payloads
+#   index    for every chunk: int64 file offset, uint32 compressed
+#            size, uint32 number of packets
+#   footer   int64 index offset, int64 number of chunks, int64 size of
+#            the original capture, 8 bytes magic
+
+# Chunk payload before compression:
+#   int64    source offset where the chunk starts
+#   uint32   number of packets n
+#   uint32   number of bytes after the last packet
+#   n uint32 number of bytes before each packet
+#   bytes    the bytes between packets, back to back
+#   41 bytes keyframe, unless n is 0
+#   41 times, one for each byte of a packet:
+#     uint32   number of changes c
+#     c uint32 packets since the previous change (or the keyframe)
+#     c bytes  new values
+
+import array
+import itertools
+import lzma
+import struct
+import sys
+import zlib
+
+from . import framing, transitions
+
+
+archive_magic = b"MB124AR1"
+archive_header = struct.Struct("<8sB3xI")
+archive_footer = struct.Struct("<qqq8s")
+chunk_entry = struct.Struct("<qII")
+chunk_header = struct.Struct("<qII")
+count_struct = struct.Struct("<I")
+
+compressions = ("zlib", "lzma")
+default_chunk_len = 600
+
+
+def _compress(data, compression):
+    if compressions[compression] == "lzma":
+        return lzma.compress(data)
+    return zlib.compress(data, 9)
+
+
+def _decompress(data, compression):
+    if compressions[compression] == "lzma":
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def _packUint32s(values):
+    data = array.array("I", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _unpackUint32s(payload, pos, count):
+    """This function returns count uint32 values from payload at pos and
+       the position after them.
+    """
+    data = array.array("I")
+    data.frombytes(payload[pos:pos + 4 * count])
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data, pos + 4 * count
+
+
+def isArchive(filename):
+    try:
+        with open(filename, "rb") as infile:
+            return infile.read(len(archive_magic)) == archive_magic
+    except OSError:
+        return False
+
+
+def _packChunk(buf, start, end, offsets):
+    """This function returns the payload of a chunk covering buf[start:end]
+       with the packets at the given offsets.
+    """
+    gaps = []
+    gap_bytes = []
+    pos = start
+    for offset in offsets:
+        gaps.append(offset - pos)
+        gap_bytes.append(buf[pos:offset])
+        pos = offset + framing.packet_len
+    gap_bytes.append(buf[pos:end])
+    parts = [chunk_header.pack(start, len(offsets), end - pos), _packUint32s(gaps), b"".join(gap_bytes)]
+    if len(offsets):
+        packets = framing.gatherPackets(buf, offsets)
+        parts.append(packets[0])
+        for col in range(framing.packet_len):
+            column = packets.column(col)
+            changes = transitions.changePoints(column)
+            parts.append(count_struct.pack(len(changes)))
+            parts.append(_packUint32s(change - previous for previous, change in zip([0] + changes, changes)))
+            parts.append(bytes([column[i] for i in changes]))
+    return b"".join(parts)
+
+
+def writeArchive(filename, output, chunk_len=default_chunk_len, compression="zlib"):
+    """This function converts the capture filename into an archive."""
+    compression = compressions.index(compression)
+    with framing.MappedCapture(filename) as buf, open(output, "wb") as outfile:
+        offsets = array.array("q", framing.iterOffsets(buf))
+        outfile.write(archive_header.pack(archive_magic, compression, chunk_len))
+        entries = []
+        start = 0
+        for first in range(0, max(len(offsets), 1), chunk_len):
+            chunk = offsets[first:first + chunk_len]
+            last = first + chunk_len >= len(offsets)
+            end = len(buf) if last else chunk[-1] + framing.packet_len
+            data = _compress(_packChunk(buf, start, end, chunk), compression)
+            entries.append(chunk_entry.pack(outfile.tell(), len(data), len(chunk)))
+            outfile.write(data)
+            start = end
+        index_offset = outfile.tell()
+        outfile.write(b"".join(entries))
+        outfile.write(archive_footer.pack(index_offset, len(entries), len(buf), archive_magic))
+
+
+class Chunk:
+    """A decoded chunk: the packets, the bytes before each packet and
+       the bytes after the last one.
+    """
+    __slots__ = ("packets", "gaps", "tail")
+
+    def __init__(self, packets, gaps, tail):
+        self.packets = packets
+        self.gaps = gaps
+        self.tail = tail
+
+
+def _columnRuns(keyvalue, changes, values, count):
+    """This function expands the change records of one byte into the
+       values of count packets.
+    """
+    runs = []
+    pos = 0
+    value = keyvalue
+    for change, new in zip(changes, values):
+        runs.append(bytes((value,)) * (change - pos))
+        pos = change
+        value = new
+    runs.append(bytes((value,)) * (count - pos))
+    return b"".join(runs)
+
+
+class Archive:
+    """Read access to an archive, one chunk at a time."""
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as infile:
+            magic, self.compression, self.chunk_len = archive_header.unpack(infile.read(archive_header.size))
+            infile.seek(-archive_footer.size, 2)
+            index_offset, chunks, self.source_size, footer_magic = archive_footer.unpack(infile.read(archive_footer.size))
+            if (magic != archive_magic) or (footer_magic != archive_magic):
+                raise ValueError(f"not a capture archive: {filename}")
+            infile.seek(index_offset)
+            self.entries = list(chunk_entry.iter_unpack(infile.read(chunks * chunk_entry.size)))
+        self.cached = (None, None)   # the latest decoded chunk as (i, Chunk)
+        self.first = [0]   # number of the first packet of each chunk
+        for offset, size, count in self.entries:
+            self.first.append(self.first[-1] + count)
+
+    def __len__(self):
+        return self.first[-1]
+
+    def _payload(self, i):
+        offset, size, count = self.entries[i]
+        with open(self.filename, "rb") as infile:
+            infile.seek(offset)
+            return _decompress(infile.read(size), self.compression)
+
+    def _layout(self, payload):
+        """This function returns the start offset, number of packets,
+           bytes before each packet, trailing byte count, position of the
+           gap bytes and position of the keyframe of a chunk payload.
+        """
+        start, count, tail = chunk_header.unpack_from(payload)
+        gaps, pos = _unpackUint32s(payload, chunk_header.size, count)
+        return start, count, gaps, tail, pos, pos + sum(gaps) + tail
+
+    def _columns(self, payload, keyframe):
+        """This function yields (keyframe value, packet numbers of the
+           changes, new values) for every byte of a chunk.
+        """
+        pos = keyframe + framing.packet_len
+        for col in range(framing.packet_len):
+            (changes,) = count_struct.unpack_from(payload, pos)
+            steps, pos = _unpackUint32s(payload, pos + count_struct.size, changes)
+            yield payload[keyframe + col], itertools.accumulate(steps), payload[pos:pos + changes]
+            pos += changes
+
+    def chunk(self, i):
+        """This function returns chunk i decoded."""
+        if self.cached[0] != i:
+            self.cached = (i, self._decodeChunk(i))
+        return self.cached[1]
+
+    def _decodeChunk(self, i):
+        payload = self._payload(i)
+        start, count, gaps, tail, gap_pos, keyframe = self._layout(payload)
+        offsets = array.array("q")
+        source = start
+        for gap in gaps:
+            source += gap
+            offsets.append(source)
+            source += framing.packet_len
+        gap_bytes = []
+        for gap in list(gaps) + [tail]:
+            gap_bytes.append(payload[gap_pos:gap_pos + gap])
+            gap_pos += gap
+        if not count:
+            return Chunk(framing.Packets(b"", offsets), gap_bytes[:-1], gap_bytes[-1])
+        data = bytearray(count * framing.packet_len)
+        for col, (keyvalue, changes, values) in enumerate(self._columns(payload, keyframe)):
+            data[col::framing.packet_len] = _columnRuns(keyvalue, changes, values, count)
+        return Chunk(framing.Packets(bytes(data), offsets), gap_bytes[:-1], gap_bytes[-1])
+
+    def packets(self, first=0, last=None):
+        """This function returns packets first to last - 1 (by default
+           all of them) as a Packets object, decoding only the chunks
+           they are in.
+        """
+        if last is None or last > len(self):
+            last = len(self)
+        first = max(first, 0)
+        data = []
+        offsets = array.array("q")
+        for i in range(len(self.entries)):
+            if self.first[i + 1] <= first or self.first[i] >= last:
+                continue
+            packets = self.chunk(i).packets
+            lo = max(first - self.first[i], 0)
+            hi = min(last - self.first[i], len(packets))
+            data.append(packets.data[lo * framing.packet_len:hi * framing.packet_len])
+            offsets.extend(packets.offsets[lo:hi])
+        return framing.Packets(b"".join(data), offsets)
+
+    def iterPackets(self):
+        """This function yields (offset, packet) tuples of the whole
+           archive one chunk at a time, like framing.iterCapture().
+        """
+        for i in range(len(self.entries)):
+            packets = self.chunk(i).packets
+            yield from zip(packets.offsets, packets)
+
+    def iterSource(self):
+        """This function yields the original capture in pieces."""
+        for i in range(len(self.entries)):
+            chunk = self.chunk(i)
+            for gap, raw in zip(chunk.gaps, chunk.packets):
+                yield gap
+                yield raw
+            yield chunk.tail
+
+    def findTransitions(self, col, mask=0xff):
+        """This function returns (packet number, old value, new value)
+           tuples for every change of the masked byte col, like
+           transitions.findTransitions(), from the change records only.
+        """
+        found = []
+        previous = None
+        for i in range(len(self.entries)):
+            payload = self._payload(i)
+            start, count, gaps, tail, gap_pos, keyframe = self._layout(payload)
+            if not count:
+                continue
+            for column, (keyvalue, changes, values) in enumerate(self._columns(payload, keyframe)):
+                if column == col:
+                    break
+            value = keyvalue & mask
+            if previous is not None and value != previous:
+                found.append((self.first[i], previous, value))
+            for change, new in zip(changes, values):
+                if new & mask != value:
+                    found.append((self.first[i] + change, value, new & mask))
+                    value = new & mask
+            previous = value
+        return found
+
+
+def loadArchive(filename):
+    """This function returns all packets of an archive as a Packets
+       object.
+    """
+    return Archive(filename).packets()
+
+
+def extractArchive(filename, output):
+    """This function converts an archive back into the original capture."""
+    with open(output, "wb") as outfile:
+        for data in Archive(filename).iterSource():
+            outfile.write(data)
+
+# EOF
@@ -0,0 +1,231 @@
+# compare.py - aligned comparison of Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Two captures are aligned on an anchor packet found in each of them:
+#   start          the first packet
+#   packet=N       packet number N
+#   time=S         S seconds from the first packet
+#   selfcal        the self-calibration countdown (0x04) at the highest
+#                  value both captures reach
+#   selfcal=N      the countdown first at N or below, 0 for its end
+#   EVENT[=STATE][#K]
+#                  the K-th (default first) event of a type named in
+#                  events.py, optionally only events into STATE, eg.
+#                  "tempmode=1" or "circmode#2"; the state at the first
+#                  packet doesn't count as an event
+# Packet A + i is then compared to packet B + i, i counting from the
+# anchors, over the stretch both captures cover.
+
+# The comparison of a data byte works on its two columns: the packets
+# where they differ are found by XORing the columns as big integers,
+# and the means and differences in physical units follow from a count
+# of the (a, b) value pairs, so no decoding per packet is needed.
+
+import collections
+
+from . import events, fields, framing, index, transitions
+
+
+class Alignment:
+    """Two framed captures aligned on their anchor packets. Aligned
+       index i runs from first to last - 1 and is packet anchor_a + i
+       of a and anchor_b + i of b.
+    """
+    def __init__(self, a, b, anchor_a, anchor_b):
+        self.a = a
+        self.b = b
+        self.anchor_a = anchor_a
+        self.anchor_b = anchor_b
+        self.first = -min(anchor_a, anchor_b)
+        self.last = min(len(a) - anchor_a, len(b) - anchor_b)
+
+    def __len__(self):
+        return max(self.last - self.first, 0)
+
+    def numbers(self, i):
+        """This function returns the packet numbers of aligned index i."""
+        return self.anchor_a + i, self.anchor_b + i
+
+    def columns(self, col):
+        """This function returns the aligned parts of byte col of both
+           captures.
+        """
+        start_a, start_b = self.numbers(self.first)
+        return (self.a.column(col)[start_a:start_a + len(self)],
+                self.b.column(col)[start_b:start_b + len(self)])
+
+
+def _selfcalStart(packets, limit):
+    column = packets.column(0x04)
+    for number, value in enumerate(column):
+        if 0 < value <= limit:
+            return number
+    return None
+
+
+def _selfcalEnd(packets):
+    column = packets.column(0x04)
+    for number in range(1, len(column)):
+        if column[number - 1] and not column[number]:
+            return number
+    return None
+
+
+def findAnchor(packets, spec, other=None):
+    """This function returns the number of the anchor packet of a framed
+       capture, see the top of this file, or None if there is none.
+       other is the capture compared to, needed by "selfcal". A
+       malformed anchor raises ValueError.
+    """
+    name, _, value = spec.partition("=")
+    try:
+        if name == "start":
+            return 0 if len(packets) else None
+        if name == "packet":
+            return int(value, 0) if 0 <= int(value, 0) < len(packets) else None
+        if name == "time":
+            return index.packetAtTime(packets, float(value)) if len(packets) else None
+        if name == "selfcal":
+            if value == "":
+                highest = max(packets.column(0x04), default=0)
+                if other is not None:
+                    highest = min(highest, max(other.column(0x04), default=0))
+                return _selfcalStart(packets, highest) if highest else None
+            if int(value) == 0:
+                return _selfcalEnd(packets)
+            return _selfcalStart(packets, int(value))
+        name, _, occurrence = spec.partition("#")
+        name, _, state = name.partition("=")
+        state = int(state) if state else None
+        occurrence = int(occurrence) if occurrence else 1
+    except ValueError:
+        raise ValueError(f"invalid anchor: {spec}") from None
+    if name not in events.event_names:
+        raise ValueError(f"unknown anchor: {spec}")
+    if occurrence < 1:
+        raise ValueError(f"event numbers start from 1: {spec}")
+    found = [event for event in events.extractEvents(packets, names=(name,))
+             if event.number and (state is None or event.state == state)]
+    return found[occurrence - 1].number if len(found) >= occurrence else None
+
+
+def alignCaptures(a, b, spec_a="start", spec_b=None):
+    """This function returns the Alignment of two framed captures on the
+       anchors given for each, spec_b defaulting to spec_a. It raises
+       ValueError when an anchor isn't found.
+    """
+    if spec_b is None:
+        spec_b = spec_a
+    anchor_a = findAnchor(a, spec_a, b)
+    if anchor_a is None:
+        raise ValueError(f"anchor {spec_a} not found in the first capture")
+    anchor_b = findAnchor(b, spec_b, a)
+    if anchor_b is None:
+        raise ValueError(f"anchor {spec_b} not found in the second capture")
+    return Alignment(a, b, anchor_a, anchor_b)
+
+
+class FieldDiff:
+    """The comparison of one data byte of two aligned captures, in the
+       physical units of the byte.
+    """
+    __slots__ = ("index", "name", "unit", "count", "differing", "mean_a", "mean_b", "max_diff", "divergences")
+
+    def __init__(self, index, name, unit, count):
+        self.index = index
+        self.name = name
+        self.unit = unit
+        self.count = count        # packets compared
+        self.differing = 0        # packets differing by more than the tolerance
+        self.mean_a = self.mean_b = 0.0
+        self.max_diff = 0.0       # largest difference a - b by magnitude
+        self.divergences = []     # aligned indexes where the captures start to differ
+
+    def asDict(self) -> dict:
+        return dict(index=self.index, name=self.name, unit=self.unit, count=self.count, differing=self.differing,
+                    mean_a=self.mean_a, mean_b=self.mean_b, mean_diff=self.mean_a - self.mean_b,
+                    max_diff=self.max_diff, divergences=self.divergences)
+
+
+_nonzero_table = bytes([0] + [1] * 255)
+
+
+def _converters(col):
+    """This function returns the functions converting a raw byte of col
+       into a signed raw value and into physical units.
+    """
+    field = fields.fields[col]
+    if field.signed:
+        signed = lambda raw: raw - 256 if raw > 127 else raw
+    else:
+        signed = lambda raw: raw
+    if field.convert is None:
+        return signed, signed
+    return signed, lambda raw: field.convert(signed(raw))
+
+
+def compareField(alignment, col, tolerance=0):
+    """This function returns the FieldDiff of data byte col. Values
+       differ when they are more than tolerance raw units apart.
+    """
+    field = fields.fields[col]
+    column_a, column_b = alignment.columns(col)
+    result = FieldDiff(col, field.eng_name if field.convert is not None else field.name, field.unit, len(column_a))
+    if not column_a:
+        return result
+    signed, convert = _converters(col)
+    total_a = total_b = 0.0
+    for (raw_a, raw_b), count in collections.Counter(zip(column_a, column_b)).items():
+        value_a = convert(raw_a)
+        value_b = convert(raw_b)
+        total_a += value_a * count
+        total_b += value_b * count
+        if abs(value_a - value_b) > abs(result.max_diff):
+            result.max_diff = value_a - value_b
+        if abs(signed(raw_a) - signed(raw_b)) > tolerance:
+            result.differing += count
+    result.mean_a = total_a / len(column_a)
+    result.mean_b = total_b / len(column_a)
+    # mark the packets differing at all, and of them those beyond the
+    # tolerance, then find where the marks start
+    diff = (int.from_bytes(column_a, "big") ^ int.from_bytes(column_b, "big")).to_bytes(len(column_a), "big")
+    if tolerance:
+        differs = bytearray(len(column_a))
+        for match in transitions.nonzero_pattern.finditer(diff):
+            position = match.start()
+            if abs(signed(column_a[position]) - signed(column_b[position])) > tolerance:
+                differs[position] = 1
+    else:
+        differs = diff.translate(_nonzero_table)
+    starts = [position for position in transitions.changePoints(differs) if differs[position]]
+    if differs[0]:
+        starts.insert(0, 0)
+    result.divergences = [position + alignment.first for position in starts]
+    return result
+
+
+def compareCaptures(alignment, columns=None, tolerance=0):
+    """This function returns the FieldDiff of every data byte, or of the
+       given ones.
+    """
+    if columns is None:
+        columns = range(framing.data_len)
+    return [compareField(alignment, col, tolerance) for col in columns]
+
+# EOF
@@ -0,0 +1,202 @@
+# derived.py - derived signals and rolling statistics for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Derived signals are declared in two tables. A Signal is computed
+# from the decoded values of a single packet, eg. the difference of the
+# adjustment target and the temperature dial. A Rolling statistic
+# follows a decoded value or a Signal over the latest 'window' packets:
+# "mean" is the moving average and "rate" the change per second from
+# the oldest packet in the window to the newest.
+
+# The Engine keeps a ring buffer per rolling statistic with a running
+# sum, so every packet costs the same whatever the window sizes. The
+# same Engine is fed packet by packet by the decoder and over whole
+# captures by deriveCapture() and the CSV/JSONL export.
+
+import array
+
+from . import fields, framing, index, timestamps, units
+
+
+class Signal:
+    __slots__ = ("name", "inputs", "function", "unit", "description")
+
+    def __init__(self, name, inputs, function, unit="", description=""):
+        self.name = name
+        self.inputs = inputs
+        self.function = function
+        self.unit = unit
+        self.description = description
+
+
+class Rolling:
+    __slots__ = ("name", "source", "kind", "window", "unit", "description")
+
+    def __init__(self, name, source, kind, window, unit="", description=""):
+        self.name = name
+        self.source = source
+        self.kind = kind
+        self.window = window
+        self.unit = unit
+        self.description = description
+
+
+def difference(a, b):
+    return a - b
+
+
+def fifthsDifference(a, b):
+    """Difference of two raw values in fifths of a degree, in °C. Taken
+       from the raw values, it is exact where the difference of the
+       converted temperatures would carry float noise.
+    """
+    return units.fifthDegrees(a - b)
+
+
+# about a minute of packets
+minute = round(60 / framing.packet_interval)
+
+signals = (Signal("target_delta_left", ("target_left", "dial_left"), difference, "", "adjustment target minus temperature dial, left, raw"),
+           Signal("target_delta_right", ("target_right", "dial_right"), difference, "", "adjustment target minus temperature dial, right, raw"),
+           Signal("target_delta_left_c", ("target_left", "dial_left"), fifthsDifference, "°C", "adjustment target minus temperature dial, left"),
+           Signal("target_delta_right_c", ("target_right", "dial_right"), fifthsDifference, "°C", "adjustment target minus temperature dial, right"),
+           Signal("ext_bias_delta", ("exterior", "ext_bias"), difference, "", "exterior temperature minus exterior temperature bias, raw"),
+           Signal("ext_minus_bias_c", ("exterior_c", "ext_bias_c"), difference, "°C", "exterior temperature minus exterior temperature bias"),
+           Signal("mixing_asymmetry_c", ("mixing_left_c", "mixing_right_c"), difference, "°C", "mixing chamber temperature, left minus right"),
+           Signal("control_asymmetry_c", ("control_left_c", "control_right_c"), difference, "°C", "temperature control, left minus right"),
+           Signal("duty_asymmetry_pct", ("duty_left_pct", "duty_right_pct"), difference, "%", "valve drive duty cycle, left minus right"),
+           )
+
+rolling = (Rolling("interior_mean_c", "interior_c", "mean", minute, "°C", "interior temperature, moving average"),
+           Rolling("exterior_mean_c", "exterior_c", "mean", minute, "°C", "exterior temperature, moving average"),
+           Rolling("mixing_left_mean_c", "mixing_left_c", "mean", minute, "°C", "mixing chamber temperature, left, moving average"),
+           Rolling("mixing_right_mean_c", "mixing_right_c", "mean", minute, "°C", "mixing chamber temperature, right, moving average"),
+           Rolling("feedback_ref_left_rate", "feedback_ref_left_c", "rate", minute, "°C/s", "change of the feedback reference, left"),
+           Rolling("feedback_ref_right_rate", "feedback_ref_right_c", "rate", minute, "°C/s", "change of the feedback reference, right"),
+           )
+
+
+class _Window:
+    """Ring buffer of the latest values and times of a rolling
+       statistic.
+    """
+    __slots__ = ("kind", "size", "values", "times", "position", "count", "total")
+
+    def __init__(self, kind, window):
+        self.kind = kind
+        self.size = window if kind == "mean" else window + 1   # a rate needs both ends of the window
+        self.values = array.array("d", bytes(8 * self.size))
+        self.times = array.array("d", bytes(8 * self.size))
+        self.clear()
+
+    def clear(self):
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value, time):
+        position = self.position
+        if self.count == self.size:
+            self.total -= self.values[position]
+        else:
+            self.count += 1
+        self.values[position] = value
+        self.times[position] = time
+        self.total += value
+        self.position = (position + 1) % self.size
+        if self.kind == "mean":
+            return self.total / self.count
+        oldest = self.position if self.count == self.size else 0
+        elapsed = time - self.times[oldest]
+        return (value - self.values[oldest]) / elapsed if elapsed > 0 else 0.0
+
+
+class Engine:
+    """Incremental computation of derived signals and rolling statistics
+       of consecutive packets. Packets skipped forward are taken as they
+       come, a packet number going backwards restarts the rolling
+       statistics. A caller seeking in a capture calls reset().
+    """
+    def __init__(self, signals=signals, rolling=rolling, interval=framing.packet_interval):
+        self.interval = interval
+        known = {name: ("packet", position) for position, name in enumerate(fields.columns)}
+        self._signals = []
+        for position, signal in enumerate(signals):
+            self._signals.append((signal.function, tuple(fields.column_index[name] for name in signal.inputs)))
+            known[signal.name] = ("signal", position)
+        self._rolling = tuple((known[statistic.source], _Window(statistic.kind, statistic.window)) for statistic in rolling)
+        self.names = tuple(signal.name for signal in signals) + tuple(statistic.name for statistic in rolling)
+        self.position = {name: position for position, name in enumerate(self.names)}
+        self.values = (0.0,) * len(self.names)
+        self.next_number = None
+
+    def reset(self):
+        for source, window in self._rolling:
+            window.clear()
+        self.next_number = None
+
+    def update(self, packet, time=None):
+        """This function returns the derived values of a fields.Packet
+           in the order of 'names'. time is the arrival time of the
+           packet in seconds, by default its number times the packet
+           interval.
+        """
+        if (self.next_number is not None) and (packet.number < self.next_number):
+            self.reset()
+        self.next_number = packet.number + 1
+        if time is None:
+            time = packet.number * self.interval
+        values = packet.values
+        derived = [function(*[values[position] for position in inputs]) for function, inputs in self._signals]
+        for (kind, position), window in self._rolling:
+            derived.append(window.add(values[position] if kind == "packet" else derived[position], time))
+        self.values = tuple(derived)
+        return self.values
+
+    def value(self, name):
+        return self.values[self.position[name]]
+
+    def asDict(self) -> dict:
+        return dict(zip(self.names, self.values))
+
+
+def iterDerived(packets, times=None, engine=None):
+    """This function yields (Packet, derived values) tuples for every
+       (offset, packet) tuple, with the arrival times of the packets if
+       given.
+    """
+    if engine is None:
+        engine = Engine()
+    for packet in fields.iterDecoded(packets):
+        yield packet, engine.update(packet, None if times is None else times[packet.number])
+
+
+def deriveCapture(filename, engine=None):
+    """This function returns the names of the derived values and a list
+       of them for every packet of a capture or archive, timed by its
+       timestamp sidecar when there is one.
+    """
+    if engine is None:
+        engine = Engine()
+    packets = index.openCapture(filename)
+    times = timestamps.packetTimes(filename, packets)
+    rows = [values for packet, values in iterDerived(zip(packets.offsets, packets), times, engine)]
+    return engine.names, rows
+
+# EOF
@@ -0,0 +1,128 @@
+# events.py - controller state change events of Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Each event type maps the raw value of one data byte to a small state
+# number with a 256 byte translation table. A whole capture is handled
+# by translating one column of the packet matrix and finding where the
+# state changes, an incoming live packet by a single table lookup per
+# event type. Both start from state 0, so the first packet reports
+# every state that differs from the default.
+
+from . import framing, index, timestamps, transitions, units
+
+
+class EventType:
+    __slots__ = ("name", "index", "table", "messages")
+
+    def __init__(self, name, index, state, messages):
+        self.name = name
+        self.index = index
+        self.table = bytes(state(raw) for raw in range(256))
+        self.messages = messages
+
+
+class Event:
+    __slots__ = ("number", "offset", "time", "name", "state", "message")
+
+    def __init__(self, number, offset, time, name, state, message):
+        self.number = number
+        self.offset = offset
+        self.time = time
+        self.name = name
+        self.state = state
+        self.message = message
+
+    def asDict(self) -> dict:
+        return dict(packet=self.number, offset=self.offset, time=self.time,
+                    event=self.name, state=self.state, message=self.message)
+
+
+event_types = (EventType("fastcool", 0x1a, lambda raw: 0 if raw & 0x40 else 1,
+                         ("Intense cooling mode off.", "Intense cooling mode on.")),
+               EventType("middleventbypass", 0x1c, lambda raw: 0 if raw & 0x01 else 1,
+                         ("Center vents temperature-controlled.", "Center vents heating bypassed.")),
+               EventType("circmode", 0x1c, lambda raw: 2 if raw & 0x04 else (1 if raw & 0x08 else 0),
+                         ("Air recirculation off.", "Air recirculation 80%.", "Air recirculation 100%.")),
+               EventType("waterpump", 0x1c, lambda raw: (raw >> 7) & 1,
+                         ("Water circulation pump off.", "Water circulation pump on.")),
+               EventType("tempmode", 0x1d, lambda raw: (raw >> 5) & 1,
+                         ("Temperature control mode: heating.", "Temperature control mode: cooling.")),
+               EventType("selfcal", 0x1d, lambda raw: (raw >> 6) & 1,
+                         ("Self-calibration off.", "Self-calibration on.")),
+               EventType("overheat", 0x18, units.overheatStage,
+                         ("Overheat protection off.", "Overheat protection stage 1.", "Overheat protection stage 2.")),
+               )
+
+event_names = tuple(event_type.name for event_type in event_types)
+
+
+def extractEvents(packets, times=None, names=None):
+    """This function returns the events of a whole capture ordered by
+       packet number. The time of an event is taken from the sequence
+       times when given, otherwise it's the nominal time in seconds
+       from the first packet. names limits the event types.
+    """
+    found = []
+    for event_type in event_types:
+        if names and event_type.name not in names:
+            continue
+        states = packets.column(event_type.index).translate(event_type.table)
+        if not states:
+            continue
+        numbers = transitions.changePoints(states)
+        if states[0]:
+            numbers.insert(0, 0)
+        for number in numbers:
+            state = states[number]
+            found.append(Event(number, packets.offsets[number],
+                               times[number] if times is not None else number * framing.packet_interval,
+                               event_type.name, state, event_type.messages[state]))
+    found.sort(key=lambda event: (event.number, event_names.index(event.name)))
+    return found
+
+
+class EventTracker:
+    """Incremental event extraction, one packet at a time."""
+    def __init__(self):
+        self.states = [0] * len(event_types)
+
+    def update(self, packet, time):
+        """This function returns the events caused by a decoded Packet."""
+        found = []
+        for i, event_type in enumerate(event_types):
+            state = event_type.table[packet.raw[event_type.index]]
+            if state != self.states[i]:
+                self.states[i] = state
+                found.append(Event(packet.number, packet.offset, time, event_type.name,
+                                   state, event_type.messages[state]))
+        return found
+
+    def state(self, name):
+        return self.states[event_names.index(name)]
+
+
+def captureEvents(filename, names=None):
+    """This function returns the events of a capture file, timed by its
+       timestamp sidecar when it has one.
+    """
+    packets = index.openCapture(filename)
+    return extractEvents(packets, timestamps.packetTimes(filename, packets), names)
+
+
+# EOF
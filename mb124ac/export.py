@@ -0,0 +1,87 @@
+# export.py - headless export of decoded Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Every stage here is a generator: packets are framed from a
+# memory-mapped capture, or decompressed from an archive a chunk at a
+# time, decoded and written one row at a time, so memory use doesn't
+# depend on the size of the capture.
+
+import csv
+import itertools
+import json
+import sys
+
+from . import archive, derived, fields, framing
+
+
+formats = ("csv", "jsonl")
+
+
+def iterRows(packets, with_derived=False):
+    """This function yields a decoded row for every (offset, packet)
+       tuple, prefixed with the packet number and source offset and
+       optionally followed by the derived signals.
+    """
+    engine = derived.Engine() if with_derived else None
+    for packet in fields.iterDecoded(packets):
+        row = dict(packet=packet.number, offset=packet.offset)
+        row.update(packet.asDict())
+        if engine is not None:
+            engine.update(packet)
+            row.update(engine.asDict())
+        yield row
+
+
+def writeCsv(rows, outfile):
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(outfile, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def writeJsonl(rows, outfile):
+    for row in rows:
+        outfile.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def exportCapture(filename, output, fmt="csv", with_derived=False):
+    """This function decodes the capture or archive filename into
+       output ("-" for standard output) in the given format, one row per
+       packet. It raises ValueError if no packets are found, before
+       output is created.
+    """
+    writer = writeCsv if fmt == "csv" else writeJsonl
+    if archive.isArchive(filename):
+        packets = archive.Archive(filename).iterPackets()
+    else:
+        packets = framing.iterCapture(filename)
+    rows = iterRows(packets, with_derived)
+    first = next(rows, None)
+    if first is None:
+        raise ValueError(f"no packets found in {filename}")
+    rows = itertools.chain((first,), rows)
+    if output == "-":
+        writer(rows, sys.stdout)
+    else:
+        with open(output, "w", newline="" if fmt == "csv" else None, encoding="utf-8") as outfile:
+            writer(rows, outfile)
+
+# EOF
@@ -0,0 +1,249 @@
+# fields.py - field table and packet decoding for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# The tuple 'fields' is indexed with the data byte index, like the
+# 'labels' tuple of ui.py. Each entry names the raw value of the
+# byte, tells whether it is signed and optionally names a value in
+# physical units along with the function to convert it.
+
+# Values derived from a byte in addition to its engineering value are
+# listed in 'extras' and single bits of the bitmask bytes in 'bits'.
+
+# A packet is decoded in one struct.unpack() call for the raw values
+# and a single pass over a precomputed plan for the rest, without any
+# knowledge of how the values are displayed.
+
+import struct
+
+from . import framing, units
+
+
+class Field:
+    __slots__ = ("index", "name", "signed", "eng_name", "convert", "unit", "description")
+
+    def __init__(self, index, name, signed, eng_name="", convert=None, unit="", description=""):
+        self.index = index
+        self.name = name
+        self.signed = signed
+        self.eng_name = eng_name
+        self.convert = convert
+        self.unit = unit
+        self.description = description
+
+
+class Extra:
+    __slots__ = ("index", "name", "convert", "unit")
+
+    def __init__(self, index, name, convert, unit=""):
+        self.index = index
+        self.name = name
+        self.convert = convert
+        self.unit = unit
+
+
+class Bit:
+    __slots__ = ("index", "bit", "name", "inverted", "description")
+
+    def __init__(self, index, bit, name, inverted=False, description=""):
+        self.index = index
+        self.bit = bit
+        self.name = name
+        self.inverted = inverted
+        self.description = description
+
+
+def selfcalSeconds(raw):
+    return raw * 5
+
+
+fields = (Field(0x00, "dial_left", True, "dial_left_c", units.dialTemp, "°C", "temperature setting dial, left"),
+          Field(0x01, "target_left", True, "target_left_c", units.dialTemp, "°C", "temperature target, left"),
+          Field(0x02, "dial_right", True, "dial_right_c", units.dialTemp, "°C", "temperature setting dial, right"),
+          Field(0x03, "target_right", True, "target_right_c", units.dialTemp, "°C", "temperature target, right"),
+          Field(0x04, "selfcal_timer", False, "selfcal_timer_s", selfcalSeconds, "s", "self-calibration timer a.k.a. switch-on countdown"),
+          Field(0x05, "mixing_left", False, "mixing_left_c", units.mixingTemp, "°C", "mixing chamber temperature, left"),
+          Field(0x06, "mixing_right", False, "mixing_right_c", units.mixingTemp, "°C", "mixing chamber temperature, right"),
+          Field(0x07, "interior", True, "interior_c", units.dialTemp, "°C", "interior temperature, raw"),
+          Field(0x08, "exterior", True, "exterior_c", units.halfDegrees, "°C", "exterior temperature (cabin air intake)"),
+          Field(0x09, "control_left", True, "control_left_c", units.fifthDegrees, "°C", "temperature control, left"),
+          Field(0x0a, "control_right", True, "control_right_c", units.fifthDegrees, "°C", "temperature control, right"),
+          Field(0x0b, "ext_bias", True, "ext_bias_c", units.fifthDegrees, "°C", "exterior/interior temperature control bias"),
+          Field(0x0c, "heater_left", False, "heater_left_delta", units.driveDelta, "", "heater drive, left"),
+          Field(0x0d, "heater_right", False, "heater_right_delta", units.driveDelta, "", "heater drive, right"),
+          Field(0x0e, "feedback_ref_left", False, "feedback_ref_left_c", units.feedbackTemp, "°C", "reference for temperature sensor (feedback), left"),
+          Field(0x0f, "feedback_ref_right", False, "feedback_ref_right_c", units.feedbackTemp, "°C", "reference for temperature sensor (feedback), right"),
+          Field(0x10, "valve_ref_left", False, "valve_ref_left_delta", units.driveDelta, "", "reference for valve drive, left"),
+          Field(0x11, "valve_ref_right", False, "valve_ref_right_delta", units.driveDelta, "", "reference for valve drive, right"),
+          Field(0x12, "valve_feedback_left", True, description="valve feedback control, left"),
+          Field(0x13, "valve_feedback_right", True, description="valve feedback control, right"),
+          Field(0x14, "duty_left", False, "duty_left_pct", units.percent, "%", "valve drive duty cycle, left"),
+          Field(0x15, "duty_right", False, "duty_right_pct", units.percent, "%", "valve drive duty cycle, right"),
+          Field(0x16, "coolant_c", False, unit="°C", description="engine coolant temperature"),
+          Field(0x17, "evaporator", True, "evaporator_c", units.halfDegrees, "°C", "evaporator temperature"),
+          Field(0x18, "overheat", False, description="overheat protection status"),
+          Field(0x19, "interior_delayed", True, "interior_delayed_c", units.dialTemp, "°C", "interior temperature, dampened"),
+          Field(0x1a, "user_input", False, description="user input and intense cooling control"),
+          Field(0x1b, "recirc_timer", False, unit="min", description="recirculation timer"),
+          Field(0x1c, "actuators", False, description="actuator control"),
+          Field(0x1d, "temp_control", False, description="temperature control"),
+          Field(0x1e, "dial_damped_left", True, "dial_damped_left_c", units.dialTemp, "°C", "temperature dial, left - dampened value"),
+          Field(0x1f, "adjust_timer_left", False, unit="s", description="temperature dial, left - adjustment timer"),
+          Field(0x20, "dial_damped_right", True, "dial_damped_right_c", units.dialTemp, "°C", "temperature dial, right - dampened value"),
+          Field(0x21, "adjust_timer_right", False, unit="s", description="temperature dial, right - adjustment timer"),
+          )
+
+extras = (Extra(0x0b, "ext_bias_target_c", units.biasTarget, "°C"),
+          Extra(0x18, "overheat_count", units.overheatCount),
+          Extra(0x18, "overheat_stage", units.overheatStage),
+          )
+
+# Bit 6 of 0x1a is reported as the decoder shows it, ie. intense
+# cooling is on when the bit is clear.
+bits = (Bit(0x1a, 0, "recirc_user", description="user input: manual forced recirculation"),
+        Bit(0x1a, 1, "economy", description="user input: economy = manual A/C off"),
+        Bit(0x1a, 2, "reheat", description="user input: reheat = manual A/C on"),
+        Bit(0x1a, 3, "adjusting_left", description="user temperature adjustment, left"),
+        Bit(0x1a, 4, "mode_change", description="mode change, user"),
+        Bit(0x1a, 5, "adjusting_right", description="user temperature adjustment, right"),
+        Bit(0x1a, 6, "intense_cooling", True, "intense cooling mode"),
+        Bit(0x1a, 7, "x1a_7", description="unknown"),
+        Bit(0x1c, 0, "center_vents_heat", description="center vents temp control: 0 = heating bypassed; 1 = heated"),
+        Bit(0x1c, 1, "radiator_blower_2", description="radiator blower, second stage"),
+        Bit(0x1c, 2, "recirc_100", description="100% recirculation"),
+        Bit(0x1c, 3, "recirc_80", description="80% recirculation"),
+        Bit(0x1c, 4, "compressor", description="A/C compressor request"),
+        Bit(0x1c, 5, "x1c_5", description="unknown"),
+        Bit(0x1c, 6, "x1c_6", description="unknown"),
+        Bit(0x1c, 7, "water_pump", description="water recirculation pump"),
+        Bit(0x1d, 0, "max_cold_left", description="max cooling, left"),
+        Bit(0x1d, 1, "defrost_left", description="defrost, left"),
+        Bit(0x1d, 2, "max_cold_right", description="max cooling, right"),
+        Bit(0x1d, 3, "defrost_right", description="defrost, right"),
+        Bit(0x1d, 4, "ext_non_freezing", description="exterior air (non-)freeze"),
+        Bit(0x1d, 5, "cooling_mode", description="control mode: 0 = heating; 1 = cooling"),
+        Bit(0x1d, 6, "self_cal", description="self-calibration"),
+        Bit(0x1d, 7, "intense_recirc", description="intense cooling mode auto-recirculation"),
+        )
+
+data_struct = struct.Struct("".join("b" if field.signed else "B" for field in fields))
+
+
+def _bitReader(bit, inverted):
+    if inverted:
+        return lambda value: ((value >> bit) & 1) ^ 1
+    return lambda value: (value >> bit) & 1
+
+
+def _makePlan():
+    """This function returns the names of all decoded values in the
+       order they are stored in a Packet, and for each of them the data
+       byte index and conversion function (None for the raw value).
+    """
+    plan = []
+    for field in fields:
+        plan.append((field.name, field.index, None))
+        if field.convert is not None:
+            plan.append((field.eng_name, field.index, field.convert))
+        for extra in extras:
+            if extra.index == field.index:
+                plan.append((extra.name, extra.index, extra.convert))
+        for bit in bits:
+            if bit.index == field.index:
+                plan.append((bit.name, bit.index, _bitReader(bit.bit, bit.inverted)))
+    plan.append(("sync_version", framing.packet_len - 1, None))
+    return tuple(name for name, index, convert in plan), tuple((index, convert) for name, index, convert in plan)
+
+
+columns, _plan = _makePlan()
+column_index = {name: position for position, name in enumerate(columns)}
+field_by_name = {field.name: field for field in fields}
+eng_position = tuple(column_index[field.eng_name if field.convert else field.name] for field in fields)
+
+
+class Packet:
+    """A decoded packet. 'ints' has the raw value of each data byte,
+       signed where appropriate, and 'values' every value named in
+       'columns', also accessible as attributes.
+    """
+    __slots__ = ("number", "offset", "raw", "ints", "values")
+
+    def __init__(self, number, offset, raw, ints, values):
+        self.number = number
+        self.offset = offset
+        self.raw = raw
+        self.ints = ints
+        self.values = values
+
+    def __getattr__(self, name):
+        try:
+            return self.values[column_index[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def engineering(self, index):
+        """This function returns the value of data byte index in
+           physical units, or the raw value when it has no conversion.
+        """
+        return self.values[eng_position[index]]
+
+    def asDict(self) -> dict:
+        return dict(zip(columns, self.values))
+
+
+def parseSelector(text):
+    """This function returns the (byte index, bit mask) tuple selected by
+       a name from 'fields' or 'bits', or by a byte index with an
+       optional bit number or bit mask, eg. "compressor", "0x1c/4",
+       "0x1c&0x60" or "0x0b". A whole byte has the mask 0xff.
+    """
+    for bit in bits:
+        if bit.name == text:
+            return bit.index, 1 << bit.bit
+    if text in field_by_name:
+        return field_by_name[text].index, 0xff
+    try:
+        if "&" in text:
+            index, _, mask = text.partition("&")
+            mask = int(mask, 0)
+        else:
+            index, _, bit = text.partition("/")
+            mask = (1 << int(bit)) if bit else 0xff
+        index = int(index, 0)
+    except ValueError:
+        raise ValueError(f"unknown field: {text}") from None
+    if not (0 <= index < framing.packet_len) or not (0 < mask <= 0xff):
+        raise ValueError(f"field out of range: {text}")
+    return index, mask
+
+
+def decodePacket(raw, number=0, offset=0):
+    """This function decodes a 41 byte packet into a Packet."""
+    ints = data_struct.unpack_from(raw)
+    values = tuple([raw[index] if index >= framing.data_len else
+                    (ints[index] if convert is None else convert(ints[index]))
+                    for index, convert in _plan])
+    return Packet(number, offset, raw, ints, values)
+
+
+def iterDecoded(packets):
+    """This function yields a Packet for every (offset, packet) tuple."""
+    for number, (offset, raw) in enumerate(packets):
+        yield decodePacket(raw, number, offset)
+
+# EOF
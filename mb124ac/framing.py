@@ -0,0 +1,342 @@
+# framing.py - packet framing for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# A packet is 0x22 data bytes followed by seven sync bytes, the
+# "trailer". All the trailer bytes are static except the last one,
+# which has been seen as either 0x3b or 0x3c depending on the control
+# unit version.
+
+# Framing is done in bulk: every trailer in a buffer is found with a
+# single regular expression scan, and a packet is accepted when its
+# trailer follows the previous trailer by exactly 0x22 bytes.
+
+# When it doesn't, the stream is resynchronised by looking back from
+# the trailer: if the seven bytes just before its packet are a damaged
+# trailer (at most two bytes wrong, or the last four bytes intact after
+# a byte was lost or inserted earlier in it), the packet is accepted
+# all the same. A damaged trailer in its right place continues the
+# look-back one packet further, so a run of damaged trailers between
+# two good ones loses no packets at all. Only bytes that can't be part
+# of any packet are dropped.
+
+# Framed packets are stored back to back in a single bytes object,
+# which makes the data a row-major (N, 41) matrix of unsigned bytes.
+# A column (one data byte of every packet) is a strided slice of it,
+# ie. data[0x0b::41], and memoryview(data).cast("B", (N, 41)) or
+# numpy.frombuffer(data, "u1").reshape(-1, 41) give a matrix view
+# without copying.
+
+import array
+import glob
+import mmap
+import os
+import re
+
+
+packet_len = 41
+data_len = 0x22
+sync_len = 7
+
+sync_prefix = b"\x00\x03\x04\x01\x23\x02"
+sync_versions = b"\x3b\x3c"
+
+sync_pattern = re.compile(re.escape(sync_prefix) + b"[" + re.escape(sync_versions) + b"]")
+
+# how many packets can be recovered by looking back from a trailer, and
+# how badly a trailer can be damaged for that
+lookback_packets = 8
+max_trailer_errors = 2
+suffix_len = 4
+
+# Nominal time between packets in seconds. The self-calibration timer
+# (0x04) steps every 5 seconds, which is every 3.5 to 3.65 packets in
+# the captures.
+packet_interval = 1.4
+
+
+class Packets:
+    """Framed packets of a data stream as an (N, 41) byte matrix with
+       the source offset of each packet.
+    """
+    __slots__ = ("data", "offsets")
+
+    def __init__(self, data=b"", offsets=None):
+        self.data = data
+        self.offsets = offsets if offsets is not None else array.array("q")
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError("packet index out of range")
+        start = index * packet_len
+        return self.data[start:start + packet_len]
+
+    def __iter__(self):
+        for start in range(0, len(self.data), packet_len):
+            yield self.data[start:start + packet_len]
+
+    def column(self, col):
+        """This function returns the byte at index col of every packet
+           as a bytes object.
+        """
+        return self.data[col::packet_len]
+
+    def matrix(self):
+        """This function returns the packets as a memoryview of shape
+           (N, 41). An empty capture returns a flat empty memoryview.
+        """
+        if not self.data:
+            return memoryview(self.data)
+        return memoryview(self.data).cast("B", (len(self.offsets), packet_len))
+
+
+def iterTrailers(buf, start=0, end=None):
+    """This function yields the offset of every sync trailer found in
+       buf.
+    """
+    if end is None:
+        end = len(buf)
+    for match in sync_pattern.finditer(buf, start, end):
+        yield match.start()
+
+
+class SyncStats:
+    """Counters of how a data stream was framed."""
+    __slots__ = ("framed", "dropped", "recovered", "bad_trailers", "versions")
+
+    def __init__(self):
+        self.framed = 0         # packets framed
+        self.dropped = 0        # bytes not belonging to any framed packet
+        self.recovered = 0      # packets framed by looking back from a trailer
+        self.bad_trailers = 0   # damaged trailers looked back over
+        self.versions = dict.fromkeys(sync_versions, 0)   # valid trailers by their last byte
+
+    def asDict(self) -> dict:
+        row = dict(framed=self.framed, dropped=self.dropped, recovered=self.recovered, bad_trailers=self.bad_trailers)
+        row.update((f"trailers_{version:02x}", count) for version, count in self.versions.items())
+        return row
+
+    def describe(self):
+        versions = " ".join(f"{version:02x}: {count}" for version, count in self.versions.items())
+        return (f"{self.framed} packets ({self.recovered} recovered), {self.dropped} bytes dropped, "
+                f"{self.bad_trailers} bad trailers, trailers {versions}")
+
+
+def _damagedTrailer(buf, slot):
+    """This function returns 1 if the seven bytes at slot of buf are a
+       trailer with at most max_trailer_errors wrong bytes, 2 if only
+       its last suffix_len bytes are intact and 0 if it's no trailer.
+    """
+    trailer = buf[slot:slot + sync_len]
+    errors = sum(byte != sync for byte, sync in zip(trailer, sync_prefix)) + (trailer[-1] not in sync_versions)
+    if errors <= max_trailer_errors:
+        return 1
+    if (trailer[sync_len - suffix_len:-1] == sync_prefix[sync_len - suffix_len:]) and (trailer[-1] in sync_versions):
+        return 2
+    return 0
+
+
+def _lookBack(buf, pos, floor, stats=None):
+    """This function returns the offsets of the packets before the
+       trailer at pos of buf that can be recovered, oldest first,
+       without going below floor, the previous valid trailer.
+    """
+    offsets = []
+    slot = pos - packet_len
+    while (slot >= floor) and (len(offsets) < lookback_packets):
+        kind = _damagedTrailer(buf, slot)
+        if not kind:
+            break
+        offsets.append(slot + sync_len)
+        if slot == floor:
+            break
+        if stats is not None:
+            stats.bad_trailers += 1
+        if kind == 2:  # misplaced by a lost or extra byte, nothing aligns before it
+            break
+        slot -= packet_len
+    offsets.reverse()
+    if stats is not None:
+        stats.recovered += len(offsets)
+    return offsets
+
+
+def iterOffsets(buf, start=0, end=None, stats=None):
+    """This function yields the offset of the first data byte of every
+       packet that has a valid trailer and directly follows another
+       valid trailer, or is recovered by looking back from a valid
+       trailer. The counters of stats are updated if given.
+    """
+    last = None
+    framed = 0
+    for pos in iterTrailers(buf, start, end):
+        if stats is not None:
+            stats.versions[buf[pos + sync_len - 1]] += 1
+        if (last is not None) and (pos - last == packet_len):
+            framed += 1
+            yield last + sync_len
+        else:
+            for offset in _lookBack(buf, pos, start if last is None else last, stats):
+                framed += 1
+                yield offset
+        last = pos
+    if stats is not None:
+        stats.framed += framed
+        stats.dropped += (len(buf) if end is None else end) - start - framed * packet_len
+
+
+def iterPackets(buf, start=0, end=None):
+    """This function yields (offset, packet) tuples from buf without
+       collecting them, for streaming through large captures.
+    """
+    for offset in iterOffsets(buf, start, end):
+        yield offset, bytes(buf[offset:offset + packet_len])
+
+
+def framePackets(buf, stats=None):
+    """This function frames every packet in buf and returns them as a
+       Packets object.
+    """
+    return gatherPackets(buf, array.array("q", iterOffsets(buf, stats=stats)))
+
+
+def gatherPackets(buf, offsets):
+    """This function copies the packets at the given offsets of buf into
+       a Packets object.
+    """
+    chunks = []
+    run_start = run_end = -1
+    for offset in offsets:  # copy runs of consecutive packets in one go
+        if offset != run_end:
+            if run_start >= 0:
+                chunks.append(buf[run_start:run_end])
+            run_start = offset
+        run_end = offset + packet_len
+    if run_start >= 0:
+        chunks.append(buf[run_start:run_end])
+    return Packets(b"".join(chunks), offsets)
+
+
+class StreamFramer:
+    """Incremental framer for a live data stream. Chunks of any size are
+       fed in and complete packets come out with the same rules as
+       framePackets(). At most lookback_packets + 1 packets worth of
+       unframed bytes are kept between calls.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.base = 0         # stream offset of buffer[0]
+        self.scanned = 0      # stream offset the next trailer search starts from
+        self.last = None      # stream offset of the latest valid trailer
+        self.accounted = 0    # stream offset up to which bytes are framed or dropped
+        self.stats = SyncStats()
+
+    def feed(self, data):
+        """This function appends data to the stream and returns a list of
+           (offset, packet) tuples for the packets completed by it.
+        """
+        buf = self.buffer
+        buf += data
+        base = self.base
+        stats = self.stats
+        packets = []
+        for match in sync_pattern.finditer(buf, self.scanned - base):
+            pos = base + match.start()
+            stats.versions[buf[match.end() - 1]] += 1
+            if (self.last is not None) and (pos - self.last == packet_len):
+                offsets = (self.last + sync_len - base,)
+            else:
+                floor = self.last if self.last is not None else 0
+                offsets = _lookBack(buf, match.start(), max(floor - base, 0), stats)
+            for offset in offsets:
+                packets.append((base + offset, bytes(buf[offset:offset + packet_len])))
+                stats.dropped += base + offset - self.accounted
+                self.accounted = base + offset + packet_len
+            self.last = pos
+        end = base + len(buf)
+        self.scanned = max(end - (sync_len - 1), self.last + sync_len if self.last is not None else 0)
+        # bytes before the latest trailer or beyond the reach of a look
+        # back from any trailer still to come are not needed any more
+        keep = max(end - (sync_len - 1) - lookback_packets * packet_len, self.last if self.last is not None else 0)
+        if keep > base:
+            del buf[:keep - base]
+            self.base = keep
+            if keep > self.accounted:
+                stats.dropped += keep - self.accounted
+                self.accounted = keep
+        stats.framed += len(packets)
+        return packets
+
+
+class MappedCapture:
+    """Context manager that memory-maps a capture file for reading. An
+       empty file is mapped as an empty bytes object.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = None
+        self.buf = b""
+
+    def __enter__(self):
+        self.file = open(self.filename, "rb")
+        if os.fstat(self.file.fileno()).st_size:
+            self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.buf
+
+    def __exit__(self, *exc):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self.buf = b""
+        self.file.close()
+        return False
+
+
+def loadCapture(filename):
+    """This function frames every packet in a capture file and returns
+       them as a Packets object.
+    """
+    with MappedCapture(filename) as buf:
+        return framePackets(buf)
+
+
+def iterCapture(filename):
+    """This function yields (offset, packet) tuples from a capture file
+       one at a time, keeping memory use constant.
+    """
+    with MappedCapture(filename) as buf:
+        yield from iterPackets(buf)
+
+
+def expandPaths(paths):
+    """This function returns the given capture files, replacing each
+       directory with the *.bin captures and *.mba archives in it.
+    """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(glob.glob(os.path.join(path, "*.bin")) + glob.glob(os.path.join(path, "*.mba"))))
+        else:
+            filenames.append(path)
+    return filenames
+
+# EOF
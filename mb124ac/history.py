@@ -0,0 +1,134 @@
+# history.py - ring buffers and sparklines for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# A RingBuffer keeps the latest 'size' values in a preallocated array,
+# so appending is O(1) and the memory use stays the same however long
+# the decoder runs.
+
+# A Sparkline follows one value with a character per 'step' packets,
+# the mean of those packets drawn as one of eight bar heights. Only the
+# newest character changes with a packet. The scale grows when a value
+# falls outside of it, and is fitted to the values on display whenever
+# they have all been replaced, so the bars are only recomputed on those
+# occasions, never for every packet.
+
+import array
+
+
+bar_chars = "▁▂▃▄▅▆▇█"
+
+
+class RingBuffer:
+    """The latest size values of an array typecode."""
+    __slots__ = ("data", "size", "position", "count")
+
+    def __init__(self, size, typecode="d"):
+        self.data = array.array(typecode, bytes(size * array.array(typecode).itemsize))
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self.position = 0   # index of the next value
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        self.data[self.position] = value
+        self.position = (self.position + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def replaceLast(self, value):
+        self.data[self.position - 1] = value
+
+    def last(self):
+        return self.data[self.position - 1]
+
+    def values(self):
+        """This function returns the values as a list, oldest first."""
+        if self.count < self.size:
+            return self.data[:self.count].tolist()
+        return self.data[self.position:].tolist() + self.data[:self.position].tolist()
+
+
+class Sparkline:
+    """Bar characters of the means of a value over every step packets,
+       the newest last.
+    """
+    def __init__(self, width, step=1):
+        self.step = step
+        self.means = RingBuffer(width, "d")
+        self.bars = RingBuffer(width, "B")
+        self.clear()
+
+    def clear(self):
+        self.means.clear()
+        self.bars.clear()
+        self.total = 0.0
+        self.count = 0      # packets in the newest character
+        self.low = self.high = None
+        self.text = ""
+
+    def _bar(self, mean):
+        if self.high == self.low:
+            return len(bar_chars) // 2
+        return round((mean - self.low) / (self.high - self.low) * (len(bar_chars) - 1))
+
+    def _rescale(self, low, high):
+        self.low = low
+        self.high = high
+        self.bars.clear()
+        for mean in self.means.values():
+            self.bars.append(self._bar(mean))
+
+    def append(self, value):
+        """This function adds the value of a packet and returns True if
+           the text of the sparkline changed.
+        """
+        if self.count == self.step:
+            self.total = 0.0
+            self.count = 0
+        self.total += value
+        self.count += 1
+        mean = self.total / self.count
+        fit = False
+        if self.count == 1:
+            self.means.append(mean)
+            self.bars.append(0)
+            fit = self.means.position == 0   # every character replaced, fit the scale
+        else:
+            self.means.replaceLast(mean)
+        if self.low is None or not (self.low <= mean <= self.high):
+            margin = max((self.high - self.low) / 4, 1) if self.low is not None else 1
+            low = mean - margin if self.low is None or mean < self.low else self.low
+            high = mean + margin if self.high is None or mean > self.high else self.high
+            self._rescale(low, high)
+        elif fit:
+            means = self.means.values()
+            self._rescale(min(means), max(means))
+        else:
+            self.bars.replaceLast(self._bar(mean))
+        text = "".join([bar_chars[bar] for bar in self.bars.values()])
+        changed = text != self.text
+        self.text = text
+        return changed
+
+# EOF
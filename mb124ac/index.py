@@ -0,0 +1,176 @@
+# index.py - packet offset index for Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# The offsets of the framed packets of a capture are stored in a
+# sidecar file next to it, named <capture>.idx. The sidecar records the
+# size and modification time of the capture and is rebuilt when either
+# of them changes.
+
+# Sidecar layout, little-endian:
+#   8 bytes  magic "MB124IX2"
+#   int64    capture size in bytes
+#   int64    capture modification time in nanoseconds
+#   int64    number of packets N
+#   N int64  source offsets of the packets
+
+# Seeking to the next or previous change of a field works on a column
+# of the framed packets masked with bytes.translate(), so the search
+# itself is done by the regular expression engine.
+
+import array
+import os
+import re
+import struct
+import sys
+
+from . import archive, framing
+
+
+index_magic = b"MB124IX2"
+index_header = struct.Struct("<8sqqq")
+
+
+def indexName(filename):
+    return filename + ".idx"
+
+
+def _readIndex(filename, st):
+    with open(indexName(filename), "rb") as idxfile:
+        magic, size, mtime_ns, count = index_header.unpack(idxfile.read(index_header.size))
+        if (magic != index_magic) or (size != st.st_size) or (mtime_ns != st.st_mtime_ns):
+            return None
+        offsets = array.array("q")
+        offsets.frombytes(idxfile.read(count * offsets.itemsize))
+    if len(offsets) != count:
+        return None
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    return offsets
+
+
+def _writeIndex(filename, st, offsets):
+    data = array.array("q", offsets)
+    if sys.byteorder == "big":
+        data.byteswap()
+    tmpname = indexName(filename) + ".tmp"
+    with open(tmpname, "wb") as idxfile:
+        idxfile.write(index_header.pack(index_magic, st.st_size, st.st_mtime_ns, len(data)))
+        data.tofile(idxfile)
+    os.replace(tmpname, indexName(filename))
+
+
+def loadOffsets(filename, cache=True):
+    """This function returns the packet offsets of a capture, from its
+       sidecar index when it is up to date. Otherwise the capture is
+       framed and, if cache is set, the sidecar is (re)written. A
+       sidecar that cannot be written is silently skipped.
+    """
+    st = os.stat(filename)
+    try:
+        offsets = _readIndex(filename, st)
+        if offsets is not None:
+            return offsets
+    except (OSError, struct.error):
+        pass
+    with framing.MappedCapture(filename) as buf:
+        offsets = array.array("q", framing.iterOffsets(buf))
+    if cache:
+        try:
+            _writeIndex(filename, st, offsets)
+        except OSError:
+            pass
+    return offsets
+
+
+def openCapture(filename, cache=True):
+    """This function returns the framed packets of a capture using its
+       sidecar index, or of a capture archive.
+    """
+    if archive.isArchive(filename):
+        return archive.loadArchive(filename)
+    offsets = loadOffsets(filename, cache)
+    with framing.MappedCapture(filename) as buf:
+        return framing.gatherPackets(buf, offsets)
+
+
+def captureSize(filename):
+    """This function returns the size in bytes of a capture, or of the
+       original capture of an archive.
+    """
+    if archive.isArchive(filename):
+        return archive.Archive(filename).source_size
+    return os.path.getsize(filename)
+
+
+def packetAtTime(packets, seconds):
+    """This function returns the number of the packet received the given
+       number of seconds after the first one, based on the nominal
+       packet interval.
+    """
+    return min(max(round(seconds / framing.packet_interval), 0), max(len(packets) - 1, 0))
+
+
+def maskedColumn(packets, index, mask):
+    """This function returns byte index of every packet masked with
+       mask.
+    """
+    column = packets.column(index)
+    if mask == 0xff:
+        return column
+    return column.translate(bytes(value & mask for value in range(256)))
+
+
+def _otherThan(value):
+    return re.compile(b"[^" + re.escape(bytes((value,))) + b"]")
+
+
+def nextChange(packets, number, index, mask=0xff):
+    """This function returns the number of the first packet after packet
+       number where the selected field changes, or None if it doesn't.
+    """
+    column = maskedColumn(packets, index, mask)
+    if not 0 <= number < len(column):
+        return None
+    match = _otherThan(column[number]).search(column, number + 1)
+    return match.start() if match else None
+
+
+def _runStart(column, number):
+    """This function returns the number of the first packet of the run of
+       equal values containing packet number.
+    """
+    match = _otherThan(column[number]).search(column[number::-1])
+    return (number - match.start() + 1) if match else 0
+
+
+def prevChange(packets, number, index, mask=0xff):
+    """This function returns the number of the latest packet before
+       packet number where the selected field changed, or the first
+       packet if it didn't change.
+    """
+    column = maskedColumn(packets, index, mask)
+    if not 0 < number <= len(column):
+        return None
+    number = min(number, len(column) - 1)
+    start = _runStart(column, number)
+    if start == number:
+        start = _runStart(column, number - 1)
+    return start
+
+# EOF
@@ -0,0 +1,155 @@
+# ingest.py - concurrent ingest of several Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Every source runs as a task of one asyncio event loop. A serial port
+# is read when its file descriptor becomes readable and framed by its
+# own StreamFramer, a capture file is replayed on its own ReplayClock.
+# Either way each framed packet is decoded and handed to a consumer
+# callback together with the source it came from, so one process can
+# follow any number of control units side by side.
+
+# The consumer runs in the event loop and must not block; anything
+# slow, like writing files or printing, belongs in a
+# logwriter.LogWriter. A serial port is closed when its source ends or
+# is cancelled.
+
+import asyncio
+import os
+import time
+
+from . import fields, framing, index, replay
+
+
+class SerialSource:
+    """A serial port opened with timeout=0 (anything with fileno(),
+       read() and in_waiting), optionally recorded with a
+       logwriter.Recorder.
+    """
+    def __init__(self, name, port, recorder=None):
+        self.name = name
+        self.port = port
+        self.recorder = recorder
+        self.framer = framing.StreamFramer()
+        self.count = 0
+
+    def dropped(self):
+        return self.framer.stats.dropped
+
+    async def run(self, consumer):
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(self.port.fileno(), readable.set)
+        try:
+            while True:
+                await readable.wait()
+                readable.clear()
+                data = self.port.read(self.port.in_waiting or 1)
+                if not data:
+                    continue
+                if self.recorder is not None:
+                    monotonic_ns = time.monotonic_ns()
+                    wall_ns = time.time_ns()
+                    self.recorder.data(data)
+                for offset, packet in self.framer.feed(data):
+                    if self.recorder is not None:
+                        self.recorder.packet(offset, packet, monotonic_ns, wall_ns)
+                    consumer(self, fields.decodePacket(packet, self.count, offset))
+                    self.count += 1
+        finally:
+            loop.remove_reader(self.port.fileno())
+            self.port.close()
+
+
+class FileSource:
+    """A capture file or archive replayed at speed times the live rate,
+       0 for as fast as possible.
+    """
+    def __init__(self, name, filename, interval=framing.packet_interval, speed=1.0):
+        self.name = name
+        self.filename = filename
+        self.packets = index.openCapture(filename)
+        self.clock = replay.ReplayClock(interval, speed)
+        self.count = 0
+
+    def dropped(self):
+        return index.captureSize(self.filename) - len(self.packets.data)
+
+    async def run(self, consumer):
+        self.clock.reset(0)
+        for number in range(len(self.packets)):
+            # sleeping 0 still lets the other sources run when unthrottled
+            await asyncio.sleep(max(self.clock.due(number) - time.monotonic(), 0))
+            consumer(self, fields.decodePacket(self.packets[number], number, self.packets.offsets[number]))
+            self.count += 1
+
+
+def sourceName(path):
+    """This function returns a short name for a port or file path."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def sourceNames(paths):
+    """This function returns a distinct short name for each path: the
+       name of sourceName() extended with as many parent directories as
+       needed to tell it apart from the others, eg. a/drive and
+       b/drive, and numbered if the same path is given twice.
+    """
+    parts = [os.path.splitext(os.path.abspath(path))[0].strip(os.sep).split(os.sep) for path in paths]
+    depths = [1] * len(paths)
+    while True:
+        names = ["/".join(part[-depth:]) for part, depth in zip(parts, depths)]
+        clashes = [i for i, name in enumerate(names)
+                   if any(names[j] == name and parts[j] != parts[i] for j in range(len(names)))
+                   and depths[i] < len(parts[i])]
+        if not clashes:
+            break
+        for i in clashes:
+            depths[i] += 1
+    seen = {}
+    for i, name in enumerate(names):
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            names[i] = f"{name}#{seen[name]}"
+    return names
+
+
+async def ingest(sources, consumer, tick=None, interval=1.0):
+    """This function runs every source until all of them have ended,
+       or forever with a serial source. tick, when given, is called every
+       interval seconds in between.
+    """
+    tasks = [asyncio.create_task(source.run(consumer)) for source in sources]
+    try:
+        while True:
+            done, pending = await asyncio.wait(tasks, timeout=interval if tick else None,
+                                               return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+            if not pending:
+                return
+            if tick is not None:
+                tick()
+    finally:
+        for task in tasks:
+            task.cancel()
+        # let the cancelled sources clean up, eg. close their ports
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# EOF
@@ -0,0 +1,152 @@
+# logwriter.py - background file writer for Mercedes-Benz 124 A/C (SA 580) data stream logging
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Whatever reads the serial port must never wait for the disk or the
+# console, otherwise the port overruns. Writes are therefore only
+# queued by the reading thread. A writer thread collects the queued
+# chunks for up to flush_interval seconds, writes them in one call and
+# flushes them, and calls fsync() every sync_interval seconds so that
+# at most that much of a log is lost on a power cut.
+
+# A Recorder ties the writers of a live recording together: the raw
+# stream into one capture and/or only the framed packets into another,
+# each with a timestamp sidecar (see timestamps.py).
+
+import os
+import queue
+import threading
+import time
+
+from . import framing, timestamps
+
+
+class LogWriter(threading.Thread):
+    """Thread writing queued bytes to an open binary file."""
+    def __init__(self, outfile, flush_interval=1.0, sync_interval=10.0):
+        super().__init__(name="log writer", daemon=True)
+        self.outfile = outfile
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval   # 0 to never fsync()
+        self.chunks = queue.SimpleQueue()
+        self.written = 0   # bytes written so far
+        self.error = None
+        self.start()
+
+    def write(self, data):
+        """This function queues data for writing and returns at once."""
+        self.chunks.put(data)
+
+    def run(self):
+        last_sync = time.monotonic()
+        stopping = False
+        try:
+            while not stopping:
+                batch = [self.chunks.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while batch[-1] is not None:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self.chunks.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                if batch[-1] is None:
+                    stopping = True
+                    batch.pop()
+                data = b"".join(batch)
+                if data:
+                    self.outfile.write(data)
+                    self.written += len(data)
+                self.outfile.flush()
+                now = time.monotonic()
+                if self.sync_interval and (stopping or now - last_sync >= self.sync_interval):
+                    os.fsync(self.outfile.fileno())
+                    last_sync = now
+        except Exception as exc:  # eg. OSError when the disk is full
+            self.error = exc
+
+    def close(self):
+        """This function writes everything queued so far and stops the
+           thread. The file itself is left open.
+        """
+        self.chunks.put(None)
+        self.join()
+
+
+class Recorder:
+    """Recorder of a live data stream, fed by the thread reading it."""
+    def __init__(self, raw_name="", framed_name="", stamps=True, sync_interval=10.0):
+        self.sync_interval = sync_interval
+        self.files = []
+        self.writers = []
+        self.raw = self._open(raw_name, stamps) if raw_name else None
+        self.framed = self._open(framed_name, stamps) if framed_name else None
+        self.framed_count = 0
+
+    def _open(self, filename, stamps):
+        """This function returns writers for a capture and its timestamp
+           sidecar (None unless stamps is set).
+        """
+        outfile = open(filename, "wb")
+        self.files.append(outfile)
+        self.writers.append(LogWriter(outfile, sync_interval=self.sync_interval))
+        if not stamps:
+            return self.writers[-1], None
+        tsfile = open(timestamps.timestampName(filename), "wb")
+        tsfile.write(timestamps.timestamp_magic)
+        self.files.append(tsfile)
+        self.writers.append(LogWriter(tsfile, sync_interval=self.sync_interval))
+        return self.writers[-2], self.writers[-1]
+
+    def data(self, data):
+        """This function records bytes as read from the stream."""
+        if self.raw is not None:
+            self.raw[0].write(data)
+
+    def packet(self, offset, packet, monotonic_ns, wall_ns):
+        """This function records a packet framed at stream offset."""
+        if self.raw is not None and self.raw[1] is not None:
+            self.raw[1].write(timestamps.packTimestamp(offset, monotonic_ns, wall_ns))
+        if self.framed is not None:
+            if not self.framed_count:  # a packet is only framed after a trailer
+                self.framed[0].write(packet[framing.data_len:])
+            self.framed[0].write(packet)
+            if self.framed[1] is not None:
+                offset = framing.sync_len + self.framed_count * framing.packet_len
+                self.framed[1].write(timestamps.packTimestamp(offset, monotonic_ns, wall_ns))
+            self.framed_count += 1
+
+    def written(self):
+        return sum(writer.written for writer in self.writers)
+
+    def error(self):
+        """This function returns the first write error, or None."""
+        for writer in self.writers:
+            if writer.error is not None:
+                return writer.error
+        return None
+
+    def close(self):
+        for writer in self.writers:
+            writer.close()
+        for outfile in self.files:
+            outfile.close()
+
+# EOF
@@ -0,0 +1,140 @@
+# profiling.py - per-stage timing of the decoder for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Each stage of handling a packet (reading the serial port, framing,
+# decoding, drawing and refreshing the terminal) is timed into a
+# histogram of logarithmic buckets, four per octave from one
+# microsecond up, so a sample costs a couple of list operations and
+# the memory use is fixed however long the decoder runs. Percentiles
+# are read from the buckets and are accurate to about 19 %.
+
+# The latency of a packet is measured from the time.monotonic() its
+# last byte was read to the end of the screen update that shows it.
+
+# Profiling is off unless a Profiler is created. The decoder then
+# only checks for None around each stage.
+
+import array
+import json
+import math
+import time
+
+
+buckets_per_octave = 4
+bucket_count = 26 * buckets_per_octave   # up to about 67 seconds
+
+
+class Histogram:
+    """Durations in seconds in logarithmic buckets."""
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = array.array("Q", bytes(8 * bucket_count))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        micros = seconds * 1e6
+        bucket = int(math.log2(micros) * buckets_per_octave) + 1 if micros >= 1 else 0
+        self.counts[min(bucket, bucket_count - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """This function returns the upper bound of the bucket holding
+           percentile p in seconds, 0 when empty.
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * p / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= max(rank, 1):
+                return min(2 ** (bucket / buckets_per_octave) / 1e6, self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def asDict(self) -> dict:
+        return dict(count=self.count,
+                    mean_ms=round(self.mean() * 1000, 4),
+                    p50_ms=round(self.percentile(50) * 1000, 4),
+                    p90_ms=round(self.percentile(90) * 1000, 4),
+                    p99_ms=round(self.percentile(99) * 1000, 4),
+                    max_ms=round(self.max * 1000, 4),
+                    buckets={f"{2 ** ((bucket - 1) / buckets_per_octave) if bucket else 0:.1f}": count
+                             for bucket, count in enumerate(self.counts) if count})
+
+
+class Profiler:
+    """Latency histograms of named stages and plain event counters.
+       Every stage should be fed by one thread only.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = time.monotonic()
+
+    def add(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.add(seconds)
+
+    def lap(self, stage, start):
+        """This function adds the time since start, a time.perf_counter()
+           value, to stage and returns the current time.perf_counter().
+        """
+        now = time.perf_counter()
+        self.add(stage, now - start)
+        return now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def status(self):
+        """This function returns a one line summary: the median and 99th
+           percentile of the latency and the 99th percentile of every
+           other stage in milliseconds.
+        """
+        parts = []
+        latency = self.stages.get("latency")
+        if latency is not None:
+            parts.append(f"latency {latency.percentile(50) * 1000:.1f}/{latency.percentile(99) * 1000:.1f}")
+        for stage, histogram in list(self.stages.items()):
+            if stage != "latency":
+                parts.append(f"{stage} {histogram.percentile(99) * 1000:.2f}")
+        return "ms p99: " + "  ".join(parts)
+
+    def asDict(self) -> dict:
+        return dict(seconds=round(time.monotonic() - self.started, 3),
+                    counters=dict(self.counters),
+                    stages={stage: histogram.asDict() for stage, histogram in list(self.stages.items())})
+
+    def dump(self, filename):
+        with open(filename, "w", encoding="utf-8") as outfile:
+            json.dump(self.asDict(), outfile, indent=1)
+            outfile.write("\n")
+
+# EOF
@@ -0,0 +1,149 @@
+# publish.py - local publishing of decoded Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Each packet is published as one JSON Lines message with the packet
+# number, offset, time of publishing, the raw packet in hexadecimal and
+# all decoded values. The message is encoded once and queued for every
+# connected subscriber. Each subscriber has its own sending thread and
+# a bounded queue, and when a subscriber doesn't keep up its oldest
+# queued messages are dropped, so a slow client never holds up the
+# publisher or the other clients.
+
+# An address is either "host:port" (host defaulting to localhost) for
+# TCP or a path containing a "/" for a Unix socket.
+
+import json
+import os
+import queue
+import socket
+import threading
+
+
+def parseAddress(text):
+    """This function returns the socket family and address of an address
+       given as "host:port", ":port" or a Unix socket path.
+    """
+    if "/" in text:
+        return socket.AF_UNIX, text
+    host, _, port = text.rpartition(":")
+    try:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    except ValueError:
+        raise ValueError(f"invalid address: {text}") from None
+
+
+def message(packet, time):
+    """This function returns the message of a decoded Packet."""
+    row = dict(packet=packet.number, offset=packet.offset, time=time, raw=packet.raw.hex())
+    row.update(packet.asDict())
+    return (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class Subscriber(threading.Thread):
+    """Thread sending queued messages to one connected client."""
+    def __init__(self, conn, maxsize):
+        super().__init__(name="subscriber", daemon=True)
+        self.conn = conn
+        self.messages = queue.Queue(maxsize)
+        self.dropped = 0   # messages dropped because the client was slow
+        self.alive = True
+
+    def put(self, data):
+        while True:
+            try:
+                self.messages.put_nowait(data)
+                return
+            except queue.Full:
+                try:
+                    self.messages.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        try:
+            while True:
+                data = self.messages.get()
+                if data is None:
+                    break
+                self.conn.sendall(data)
+        except OSError:  # the client went away
+            pass
+        self.alive = False
+        self.conn.close()
+
+    def close(self):
+        self.put(None)
+
+
+class Publisher:
+    """Server publishing packets to any number of subscribers."""
+    def __init__(self, address, maxsize=256):
+        self.family, self.address = parseAddress(address)
+        self.maxsize = maxsize
+        self.subscribers = []
+        self.lock = threading.Lock()
+        if self.family == socket.AF_UNIX and os.path.exists(self.address):
+            os.unlink(self.address)  # left over from an earlier run
+        self.server = socket.socket(self.family, socket.SOCK_STREAM)
+        if self.family == socket.AF_INET:
+            self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen()
+        threading.Thread(target=self._accept, name="publisher", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:  # the server was closed
+                return
+            subscriber = Subscriber(conn, self.maxsize)
+            subscriber.start()
+            with self.lock:
+                self.subscribers.append(subscriber)
+
+    def clients(self):
+        with self.lock:
+            self.subscribers = [subscriber for subscriber in self.subscribers if subscriber.alive]
+            return list(self.subscribers)
+
+    def dropped(self):
+        return sum(subscriber.dropped for subscriber in self.clients())
+
+    def publish(self, packet, time):
+        """This function queues a decoded Packet for every subscriber."""
+        subscribers = self.clients()
+        if not subscribers:
+            return
+        data = message(packet, time)
+        for subscriber in subscribers:
+            subscriber.put(data)
+
+    def close(self):
+        self.server.close()
+        for subscriber in self.clients():
+            subscriber.close()
+        if self.family == socket.AF_UNIX:
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+
+# EOF
@@ -0,0 +1,238 @@
+# pyramid.py - multi-resolution summaries of Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# The summary pyramid of a capture has the minimum, maximum and mean of
+# every data byte over blocks of 10, 60, 600 and 3600 packets, the last
+# block of each level being partial. A whole drive can then be drawn at
+# any zoom level from a few kilobytes. The first level is computed from
+# the columns of the framed packets with min(), max() and sum() over
+# bytes slices, every other level from the level below it.
+
+# Minimums and maximums are stored as bytes in order of value: the raw
+# value of an unsigned byte, and a signed value plus 128 (the raw byte
+# with its top bit flipped), so bytes compare in the order of the signed
+# values. Means are stored as signed or unsigned values.
+
+# The pyramid is cached in a sidecar file <capture>.pyr next to the
+# capture, which is rebuilt when the capture changes like its index.
+
+# Sidecar layout, little-endian:
+#   8 bytes  magic "MB124PY1"
+#   int64    capture size in bytes
+#   int64    capture modification time in nanoseconds
+#   int64    number of packets N
+#   uint32   number of levels
+# and for every level:
+#   uint32   block size in packets
+#   uint32   number of blocks B
+#   34 * B   minimums, one run of B blocks per data byte
+#   34 * B   maximums, likewise
+#   34 * B   float32 means, likewise
+
+import array
+import os
+import struct
+import sys
+
+from . import fields, framing, index
+
+
+pyramid_magic = b"MB124PY1"
+pyramid_header = struct.Struct("<8sqqqI")
+level_header = struct.Struct("<II")
+
+block_sizes = (10, 60, 600, 3600)
+
+_flip = bytes(value ^ 0x80 for value in range(256))
+
+
+def pyramidName(filename):
+    return filename + ".pyr"
+
+
+class Level:
+    """Summaries of one block size, each data byte as a run of blocks."""
+    __slots__ = ("block", "blocks", "packets", "mins", "maxs", "means")
+
+    def __init__(self, block, packets, mins, maxs, means):
+        self.block = block
+        self.packets = packets
+        self.blocks = -(-packets // block)
+        self.mins = mins
+        self.maxs = maxs
+        self.means = means
+
+    def blockCount(self, number):
+        """This function returns the number of packets in block number."""
+        return min(self.block, self.packets - number * self.block)
+
+    def field(self, col, first=0, last=None):
+        """This function returns lists of the minimums, maximums and
+           means of data byte col in blocks first to last.
+        """
+        if last is None:
+            last = self.blocks
+        # never read into the blocks of the next data byte
+        first = max(first, 0)
+        last = min(last, self.blocks)
+        start = col * self.blocks
+        offset = 128 if fields.fields[col].signed else 0
+        mins = [value - offset for value in self.mins[start + first:start + last]]
+        maxs = [value - offset for value in self.maxs[start + first:start + last]]
+        return mins, maxs, self.means[start + first:start + last].tolist()
+
+
+def _firstLevel(packets, block):
+    count = len(packets)
+    blocks = -(-count // block)
+    mins = bytearray()
+    maxs = bytearray()
+    means = array.array("f")
+    for field in fields.fields:
+        column = packets.column(field.index)
+        if field.signed:
+            column = column.translate(_flip)
+        offset = 128 if field.signed else 0
+        for start in range(0, count, block):
+            chunk = column[start:start + block]
+            mins.append(min(chunk))
+            maxs.append(max(chunk))
+            means.append(sum(chunk) / len(chunk) - offset)
+    return Level(block, count, bytes(mins), bytes(maxs), means)
+
+
+def _nextLevel(lower, block):
+    factor = block // lower.block
+    counts = [lower.blockCount(number) for number in range(lower.blocks)]
+    mins = bytearray()
+    maxs = bytearray()
+    means = array.array("f")
+    for col in range(framing.data_len):
+        start = col * lower.blocks
+        for first in range(0, lower.blocks, factor):
+            last = min(first + factor, lower.blocks)
+            mins.append(min(lower.mins[start + first:start + last]))
+            maxs.append(max(lower.maxs[start + first:start + last]))
+            total = sum(mean * count for mean, count in zip(lower.means[start + first:start + last], counts[first:last]))
+            means.append(total / sum(counts[first:last]))
+    return Level(block, lower.packets, bytes(mins), bytes(maxs), means)
+
+
+class Pyramid:
+    def __init__(self, packets, levels):
+        self.packets = packets   # number of packets summarised
+        self.levels = levels
+
+    def level(self, block):
+        for level in self.levels:
+            if level.block == block:
+                return level
+        raise KeyError(block)
+
+    def overview(self, col, first=0, last=None, points=100):
+        """This function returns the summary of data byte col over
+           packets first to last in at most about points rows. It uses
+           the finest level that fits, or the coarsest one. A row is a
+           tuple of the first packet, minimum, maximum and mean of a
+           block.
+        """
+        if last is None:
+            last = self.packets
+        first = max(first, 0)
+        last = min(last, self.packets)
+        if not self.levels or last <= first:
+            return []
+        for level in self.levels:
+            if (last - first) / level.block <= points:
+                break
+        first_block = first // level.block
+        last_block = min(-(-last // level.block), level.blocks)
+        mins, maxs, means = level.field(col, first_block, last_block)
+        return [(number * level.block, low, high, mean)
+                for number, low, high, mean in zip(range(first_block, last_block), mins, maxs, means)]
+
+
+def buildPyramid(packets, sizes=block_sizes):
+    """This function returns the summary Pyramid of a framed capture."""
+    if not len(packets):
+        return Pyramid(0, [])
+    levels = [_firstLevel(packets, sizes[0])]
+    for block in sizes[1:]:
+        levels.append(_nextLevel(levels[-1], block))
+    return Pyramid(len(packets), levels)
+
+
+def _readPyramid(filename, st):
+    with open(pyramidName(filename), "rb") as pyrfile:
+        magic, size, mtime_ns, count, level_count = pyramid_header.unpack(pyrfile.read(pyramid_header.size))
+        if (magic != pyramid_magic) or (size != st.st_size) or (mtime_ns != st.st_mtime_ns):
+            return None
+        levels = []
+        for number in range(level_count):
+            block, blocks = level_header.unpack(pyrfile.read(level_header.size))
+            length = blocks * framing.data_len
+            mins = pyrfile.read(length)
+            maxs = pyrfile.read(length)
+            means = array.array("f")
+            means.frombytes(pyrfile.read(length * means.itemsize))
+            if (len(mins) != length) or (len(maxs) != length) or (len(means) != length):
+                return None
+            if sys.byteorder == "big":
+                means.byteswap()
+            levels.append(Level(block, count, mins, maxs, means))
+    return Pyramid(count, levels)
+
+
+def _writePyramid(filename, st, pyramid):
+    tmpname = pyramidName(filename) + ".tmp"
+    with open(tmpname, "wb") as pyrfile:
+        pyrfile.write(pyramid_header.pack(pyramid_magic, st.st_size, st.st_mtime_ns, pyramid.packets, len(pyramid.levels)))
+        for level in pyramid.levels:
+            means = array.array("f", level.means)
+            if sys.byteorder == "big":
+                means.byteswap()
+            pyrfile.write(level_header.pack(level.block, level.blocks))
+            pyrfile.write(level.mins)
+            pyrfile.write(level.maxs)
+            means.tofile(pyrfile)
+    os.replace(tmpname, pyramidName(filename))
+
+
+def loadPyramid(filename, cache=True):
+    """This function returns the summary Pyramid of a capture or archive,
+       from its sidecar when it is up to date. Otherwise the pyramid is
+       built and, if cache is set, the sidecar is (re)written. A sidecar
+       that cannot be written is silently skipped.
+    """
+    st = os.stat(filename)
+    try:
+        pyramid = _readPyramid(filename, st)
+        if pyramid is not None:
+            return pyramid
+    except (OSError, struct.error):
+        pass
+    pyramid = buildPyramid(index.openCapture(filename, cache))
+    if cache:
+        try:
+            _writePyramid(filename, st, pyramid)
+        except OSError:
+            pass
+    return pyramid
+
+# EOF
@@ -0,0 +1,214 @@
+# query.py - packet queries over Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# A query is a Python-like expression of the values named in
+# fields.columns, eg. "heater_left > 200 and compressor" or
+# "interior_c < 18 and not (recirc_100 or recirc_80)". byte(i) is the
+# raw value of data byte i and bit(i, n) its bit n.
+
+# Every value in fields.columns is a function of a single data byte.
+# Each part of a query that depends on one data byte only is therefore
+# evaluated for all 256 values of that byte once, into a table for
+# bytes.translate(), and applied to the whole column of the packet
+# matrix in one go. The resulting columns of zeros and ones are
+# combined with "and", "or" and "not" as big integers, the same way as
+# in transitions.py, and the matching packets are found by the regular
+# expression engine.
+
+import ast
+import operator
+
+from . import fields, framing, index, transitions
+
+
+_binary = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+           ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+           ast.BitAnd: operator.and_, ast.BitOr: operator.or_, ast.BitXor: operator.xor,
+           ast.LShift: operator.lshift, ast.RShift: operator.rshift}
+_unary = {ast.USub: operator.neg, ast.UAdd: operator.pos, ast.Invert: operator.invert, ast.Not: operator.not_}
+_compare = {ast.Eq: operator.eq, ast.NotEq: operator.ne, ast.Lt: operator.lt,
+            ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge}
+
+_plan = dict(zip(fields.columns, fields._plan))
+
+
+def _byteArgument(node):
+    if not (isinstance(node, ast.Constant) and type(node.value) is int and 0 <= node.value < framing.packet_len):
+        raise ValueError("byte() and bit() need a byte index between 0 and 40")
+    return node.value
+
+
+def _bitArgument(node):
+    if not (isinstance(node, ast.Constant) and type(node.value) is int and 0 <= node.value <= 7):
+        raise ValueError("bit() needs a bit number between 0 and 7")
+    return node.value
+
+
+def _bytesUsed(node):
+    """This function returns the set of data byte indexes the values in
+       an expression are read from.
+    """
+    used = set()
+    functions = {id(child.func) for child in ast.walk(node) if isinstance(child, ast.Call)}
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and id(child) not in functions:
+            if child.id not in _plan:
+                raise ValueError(f"unknown field: {child.id}")
+            used.add(_plan[child.id][0])
+        elif isinstance(child, ast.Call):
+            if not (isinstance(child.func, ast.Name) and child.func.id in ("byte", "bit")):
+                raise ValueError("only byte() and bit() can be called")
+            if len(child.args) != (1 if child.func.id == "byte" else 2):
+                raise ValueError(f"wrong number of arguments to {child.func.id}()")
+            used.add(_byteArgument(child.args[0]))
+            if child.func.id == "bit":
+                _bitArgument(child.args[1])
+    return used
+
+
+def _rawValue(index, raw):
+    return raw - 256 if (index < framing.data_len) and fields.fields[index].signed and raw > 127 else raw
+
+
+def _evaluate(node, raw):
+    """This function returns the value of an expression of a single data
+       byte when the byte is raw.
+    """
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float)):
+            raise ValueError(f"not a number: {node.value!r}")
+        return node.value
+    if isinstance(node, ast.Name):
+        index, convert = _plan[node.id]
+        value = _rawValue(index, raw)
+        return value if convert is None else convert(value)
+    if isinstance(node, ast.Call):
+        value = _rawValue(_byteArgument(node.args[0]), raw)
+        if node.func.id == "bit":
+            return (value >> _bitArgument(node.args[1])) & 1
+        return value
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _unary:
+        return _unary[type(node.op)](_evaluate(node.operand, raw))
+    if isinstance(node, ast.BinOp) and type(node.op) in _binary:
+        return _binary[type(node.op)](_evaluate(node.left, raw), _evaluate(node.right, raw))
+    if isinstance(node, ast.BoolOp):
+        values = [_evaluate(value, raw) for value in node.values]
+        return all(values) if isinstance(node.op, ast.And) else any(values)
+    if isinstance(node, ast.Compare):
+        left = _evaluate(node.left, raw)
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _compare:
+                raise ValueError("only ==, !=, <, <=, > and >= can compare values")
+            right = _evaluate(comparator, raw)
+            if not _compare[type(op)](left, right):
+                return False
+            left = right
+        return True
+    raise ValueError(f"unsupported expression: {ast.unparse(node)}")
+
+
+def _table(node):
+    """This function returns the bytes.translate() table of an expression
+       of a single data byte, 1 where it is true and 0 where not.
+    """
+    table = bytearray(256)
+    for raw in range(256):
+        try:
+            table[raw] = 1 if _evaluate(node, raw) else 0
+        except ArithmeticError:  # eg. division by zero, doesn't match
+            pass
+        except TypeError:  # eg. ~ of a temperature
+            raise ValueError(f"unsupported expression: {ast.unparse(node)}") from None
+    return bytes(table)
+
+
+def _compile(node):
+    """This function returns the compiled form of an expression: a tuple
+       ("byte", index, table), ("and", parts), ("or", parts) or ("not",
+       part).
+    """
+    used = _bytesUsed(node)
+    if len(used) == 1:
+        return ("byte", used.pop(), _table(node))
+    if not used:
+        raise ValueError(f"no field in: {ast.unparse(node)}")
+    if isinstance(node, ast.BoolOp):
+        return ("and" if isinstance(node.op, ast.And) else "or", [_compile(value) for value in node.values])
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ("not", _compile(node.operand))
+    raise ValueError(f"values of different bytes can only be combined with and, or and not: {ast.unparse(node)}")
+
+
+class Query:
+    """A compiled query, see the top of this file."""
+    def __init__(self, text):
+        self.text = text
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as error:
+            raise ValueError(f"invalid query: {error.msg}") from None
+        self.compiled = _compile(tree.body)
+
+    def _mask(self, packets, part, ones):
+        kind = part[0]
+        if kind == "byte":
+            return int.from_bytes(packets.column(part[1]).translate(part[2]), "big")
+        if kind == "not":
+            return ones ^ self._mask(packets, part[1], ones)
+        masks = [self._mask(packets, sub, ones) for sub in part[1]]
+        result = masks[0]
+        for mask in masks[1:]:
+            result = (result & mask) if kind == "and" else (result | mask)
+        return result
+
+    def matches(self, packets):
+        """This function returns the numbers of the packets of a Packets
+           object that match the query.
+        """
+        count = len(packets)
+        if not count:
+            return []
+        mask = self._mask(packets, self.compiled, int.from_bytes(b"\x01" * count, "big"))
+        return [match.start() for match in transitions.nonzero_pattern.finditer(mask.to_bytes(count, "big"))]
+
+
+def queryCapture(filename, text):
+    """This function returns the (packet number, offset) tuples of the
+       packets of a capture or archive matching a query.
+    """
+    packets = index.openCapture(filename)
+    return [(number, packets.offsets[number]) for number in Query(text).matches(packets)]
+
+
+def queryFiles(filenames, text, jobs=None):
+    """This function yields (filename, matches) tuples of several
+       captures, in order, queried in a process pool. The query is
+       compiled once first so that errors are raised here. A single
+       capture or job is queried without the pool.
+    """
+    Query(text)
+    if (len(filenames) < 2) or (jobs == 1):
+        for filename in filenames:
+            yield filename, queryCapture(filename, text)
+        return
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        yield from zip(filenames, pool.map(queryCapture, filenames, [text] * len(filenames)))
+
+# EOF
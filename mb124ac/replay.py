@@ -0,0 +1,111 @@
+# replay.py - packet replay scheduling for Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Packets are scheduled against an anchor (a packet number and the
+# time.monotonic() it was due at) rather than by sleeping between
+# packets, so time spent decoding and drawing doesn't accumulate as
+# drift. Whoever falls behind the schedule can ask for the packet that
+# is due right now and skip the ones in between.
+
+import math
+import time
+
+from . import framing
+
+
+# replay speeds stepped through with ReplayClock.faster() and
+# slower(), 0 meaning unthrottled
+speed_steps = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 0)
+
+
+def checkSpeed(speed):
+    """This function raises ValueError unless speed is a valid replay
+       speed: positive, or 0 for unthrottled.
+    """
+    if not speed >= 0:  # also catches NaN
+        raise ValueError(f"replay speed must be positive, or 0 for as fast as possible, not {speed:g}")
+
+
+class ReplayClock:
+    def __init__(self, interval=framing.packet_interval, speed=1.0):
+        checkSpeed(speed)
+        self.interval = interval  # seconds between packets at 1x
+        self.speed = speed
+        self.reset(0)
+
+    def reset(self, number):
+        """This function makes packet number due right now."""
+        self.origin_number = number
+        self.origin_time = time.monotonic()
+
+    def setSpeed(self, speed, number):
+        """This function changes the speed, continuing from packet
+           number without a jump.
+        """
+        checkSpeed(speed)
+        self.speed = speed
+        self.reset(number)
+
+    def faster(self, number):
+        self.setSpeed(self._step(+1), number)
+
+    def slower(self, number):
+        self.setSpeed(self._step(-1), number)
+
+    def _step(self, direction):
+        speeds = speed_steps[:-1]
+        if not self.speed:
+            return speeds[-1] if direction < 0 else 0
+        if direction > 0:
+            return next((speed for speed in speeds if speed > self.speed), 0)
+        return next((speed for speed in reversed(speeds) if speed < self.speed), speeds[0])
+
+    def due(self, number):
+        """This function returns the time.monotonic() at which packet
+           number is due, 0 when unthrottled.
+        """
+        if not self.speed:
+            return 0.0
+        return self.origin_time + (number - self.origin_number) * self.interval / self.speed
+
+    def wait(self, number, timeout):
+        """This function sleeps until packet number is due, but at most
+           timeout seconds. It returns True if the packet is due.
+        """
+        delay = self.due(number) - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            return delay <= timeout
+        return True
+
+    def current(self):
+        """This function returns the number of the latest packet that is
+           due, or None when unthrottled.
+        """
+        if not self.speed:
+            return None
+        elapsed = time.monotonic() - self.origin_time
+        return self.origin_number + math.floor(elapsed * self.speed / self.interval)
+
+    def describe(self):
+        if not self.speed:
+            return "max"
+        return f"{self.speed:g}x"
+
+# EOF
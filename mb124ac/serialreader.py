@@ -0,0 +1,110 @@
+# serialreader.py - threaded serial port reader for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# The reader thread does nothing but drain the serial port: whatever is
+# waiting is read in one call, framed, and complete packets are put in
+# a bounded queue. When the consumer falls behind, the oldest queued
+# packet is dropped, so the port is always drained in time and the
+# display always gets the latest data.
+
+# An optional logwriter.Recorder gets every byte and every packet
+# before anything is dropped, stamped with the time it was read.
+
+# An optional profiling.Profiler gets the time spent reading whatever
+# was waiting ("read") and framing it ("sync").
+
+import queue
+import threading
+import time
+
+from . import framing
+
+
+class SerialReader(threading.Thread):
+    """Thread reading an open serial port (anything with read() and
+       in_waiting) and handing framed (offset, packet, arrival) tuples to
+       get(), arrival being the time.monotonic() the last byte of the
+       packet was read.
+    """
+    def __init__(self, port, maxsize=64, recorder=None, profiler=None):
+        super().__init__(name="serial reader", daemon=True)
+        self.port = port
+        self.recorder = recorder
+        self.profiler = profiler
+        self.packets = queue.Queue(maxsize)
+        self.framer = framing.StreamFramer()
+        self.stopping = threading.Event()
+        self.overflows = 0     # packets dropped because of a slow consumer
+        self.last_data = 0.0   # time.monotonic() of the latest received bytes
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stopping.is_set():
+                # blocks for up to the port timeout when nothing is waiting
+                waiting = self.port.in_waiting
+                if (self.profiler is not None) and waiting:
+                    start = time.perf_counter()
+                data = self.port.read(waiting or 1)
+                if data:
+                    arrival = self.last_data = time.monotonic()
+                    if self.profiler is not None:
+                        if waiting:
+                            start = self.profiler.lap("read", start)
+                        else:
+                            start = time.perf_counter()
+                    if self.recorder is not None:
+                        monotonic_ns = time.monotonic_ns()
+                        wall_ns = time.time_ns()
+                        self.recorder.data(data)
+                    for offset, packet in self.framer.feed(data):
+                        if self.recorder is not None:
+                            self.recorder.packet(offset, packet, monotonic_ns, wall_ns)
+                        self.put((offset, packet, arrival))
+                    if self.profiler is not None:
+                        self.profiler.lap("sync", start)
+        except Exception as exc:  # eg. serial.SerialException when unplugged
+            self.error = exc
+
+    def put(self, item):
+        while True:
+            try:
+                self.packets.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.packets.get_nowait()
+                    self.overflows += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        """This function returns the next (offset, packet, arrival) tuple,
+           or None if none arrives within timeout seconds.
+        """
+        try:
+            return self.packets.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+# EOF
@@ -0,0 +1,115 @@
+# stats.py - field statistics over Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Everything is computed from 256-bin histograms of the raw data bytes.
+# A histogram is counted from one column of the packet matrix in a
+# single C-level pass, histograms of several captures merge by adding
+# them up, and min, max, mean and percentiles follow from the merged
+# histogram without touching the packets again.
+
+import collections
+
+from . import fields, framing, index, units
+
+
+def columnHistogram(column):
+    """This function returns a list of 256 counts of the byte values in
+       column.
+    """
+    histogram = [0] * 256
+    for value, count in collections.Counter(column).items():
+        histogram[value] = count
+    return histogram
+
+
+def captureHistograms(filename):
+    """This function returns the number of packets in a capture and a
+       histogram for each of its data bytes.
+    """
+    packets = index.openCapture(filename)
+    return len(packets), [columnHistogram(packets.column(col)) for col in range(framing.data_len)]
+
+
+def _mapCaptures(function, filenames, jobs):
+    """This function yields function(filename) of every capture, from a
+       process pool unless there is a single capture or job.
+    """
+    if (len(filenames) < 2) or (jobs == 1):
+        yield from map(function, filenames)
+        return
+    import concurrent.futures
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        yield from pool.map(function, filenames)
+
+
+def corpusHistograms(filenames, jobs=None):
+    """This function counts the histograms of several captures in a
+       process pool. It returns a dict of packet counts by file name
+       and the merged histograms.
+    """
+    counts = {}
+    merged = [[0] * 256 for col in range(framing.data_len)]
+    for filename, (count, histograms) in zip(filenames, _mapCaptures(captureHistograms, filenames, jobs)):
+        counts[filename] = count
+        for total, histogram in zip(merged, histograms):
+            for value in range(256):
+                total[value] += histogram[value]
+    return counts, merged
+
+
+# data bytes that are 0 when inactive rather than reading zero: the
+# self-calibration, recirculation and adjustment timers and the
+# overheat protection status
+idle_zero_fields = (0x04, 0x18, 0x1b, 0x1f, 0x21)
+
+
+def orderedBins(col, histogram, skip_zero=False):
+    """This function returns (value, count) tuples of a histogram in
+       ascending order of value, signed where the field is signed.
+    """
+    if fields.fields[col].signed:
+        order = list(range(128, 256)) + list(range(128))
+    else:
+        order = range(256)
+    return [(units.signedByte(raw) if fields.fields[col].signed else raw, histogram[raw])
+            for raw in order if histogram[raw] and not (skip_zero and raw == 0)]
+
+
+def summary(col, histogram, percentiles=(5, 50, 95), skip_zero=False):
+    """This function returns a dict with the number of values, min, max,
+       mean and the given percentiles of a data byte, or None when
+       there are no values.
+    """
+    bins = orderedBins(col, histogram, skip_zero)
+    total = sum(count for value, count in bins)
+    if not total:
+        return None
+    result = dict(count=total, min=bins[0][0], max=bins[-1][0],
+                  mean=sum(value * count for value, count in bins) / total)
+    for percentile in percentiles:
+        rank = percentile / 100 * total
+        cumulative = 0
+        for value, count in bins:
+            cumulative += count
+            if cumulative >= rank:
+                break
+        result[f"p{percentile:g}"] = value
+    return result
+
+# EOF
@@ -0,0 +1,279 @@
+# synth.py - synthetic data streams of Mercedes-Benz 124 A/C (SA 580) control units
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# Simulator produces packets from a crude model of a car started cold
+# and driven, stepped one packet interval at a time. The behaviour of
+# each byte follows doc/datastream.org where it is known:
+
+# - the self-calibration timer (0x04) counts down from 120 in 5 second
+#   steps, with self-calibration (0x1d bit 6) at 114, 60 and 0 and
+#   intense cooling recirculation (0x1d bit 7) enabled from 96
+# - the heater feedback references (0x0e, 0x0f) follow the heater drive
+#   down by one every 2 s and up by one every 5 s, the valve drive
+#   references (0x10, 0x11) down by one every second and up by one
+#   every 3 s
+# - the compressor request, radiator blower, overheat protection,
+#   temperature control mode, intense cooling and water pump switch
+#   with the documented thresholds and hysteresis
+# - dial adjustments are dampened through 0x1e/0x20 with the timers
+#   0x1f/0x21
+
+# The values are plausible rather than accurate, the point is to have
+# any amount of valid and well-behaved data for load testing. Corruptor
+# then damages packets on purpose to exercise framing.
+
+import random
+
+from . import fields, framing, units
+
+
+# A packet is only framed after a trailer, so a generated stream starts
+# with one.
+lead_in = framing.sync_prefix + framing.sync_versions[:1]
+
+
+def _clamp(value, low, high):
+    return min(max(int(value), low), high)
+
+
+def _follow(value, target, elapsed, down, up):
+    """This function returns value stepped towards target by one every
+       down or up seconds, elapsed being the seconds not yet spent, and
+       the seconds left over.
+    """
+    while True:
+        if target < value and elapsed >= down:
+            value -= 1
+            elapsed -= down
+        elif target > value and elapsed >= up:
+            value += 1
+            elapsed -= up
+        else:
+            return value, elapsed if target != value else 0.0
+
+
+class Simulator:
+    def __init__(self, seed=None, exterior=20.0, interior=None, coolant=None, dial=22.0):
+        self.random = random.Random(seed)
+        self.time = 0.0                       # seconds since ignition on
+        self.exterior = exterior              # °C
+        self.interior = exterior if interior is None else interior
+        self.interior_delayed = self.interior
+        self.coolant = exterior if coolant is None else coolant
+        self.evaporator = exterior
+        self.dial = [_clamp(round(dial * 5) - 126, -128, 127)] * 2   # raw, left and right
+        self.dial_damped = list(self.dial)
+        self.adjust_timer = [0, 0]
+        self.adjust_elapsed = [0.0, 0.0]
+        self.feedback_ref = [80, 80]
+        self.feedback_elapsed = [0.0, 0.0]
+        self.valve_ref = [80, 80]
+        self.valve_elapsed = [0.0, 0.0]
+        self.mixing = [self.interior, self.interior]     # °C
+        self.compressor = False
+        self.radiator_blower = False
+        self.cooling = False
+        self.intense = False
+        self.water_pump = False
+        self.overheat_stage = 0
+        self.overheat_count = 0
+        self.recirc_timer = 0
+
+    def adjust(self, side, dial):
+        """This function turns the temperature dial of a side (0 = left)
+           to dial °C.
+        """
+        raw = _clamp(round(dial * 5) - 126, -128, 127)
+        if abs(raw - self.dial_damped[side]) > 3:
+            self.adjust_timer[side] = _clamp(300 // abs(raw - self.dial_damped[side]), 4, 75)
+        else:
+            self.dial_damped[side] = raw
+        self.dial[side] = raw
+
+    def _inputs(self, dt):
+        """This function moves the physical quantities on by dt seconds."""
+        rnd = self.random
+        self.exterior += rnd.gauss(0, 0.02)
+        self.coolant += (90 - self.coolant) * dt / 400 + rnd.gauss(0, 0.05)
+        heating = sum(self.mixing) / 2 - self.interior
+        self.interior += (heating * 0.01 + (self.exterior - self.interior) * 0.001) * dt + rnd.gauss(0, 0.02)
+        self.interior_delayed += (self.interior - self.interior_delayed) * dt / 60
+        evaporator_target = 3.0 if self.compressor else self.exterior
+        self.evaporator += (evaporator_target - self.evaporator) * dt / 30
+        if rnd.random() < dt / 900:   # the driver fiddles with a dial now and then
+            self.adjust(rnd.randrange(2), rnd.choice((19, 20, 21, 22, 23, 24, 25)) + rnd.random())
+
+    def packet(self):
+        """This function returns the next packet and advances the model
+           by one packet interval.
+        """
+        dt = framing.packet_interval
+        self._inputs(dt)
+        t = self.time
+
+        selfcal_timer = max(120 - int(t // 5), 0)
+        self_cal = any(0 <= t - start < 5 for start in (30, 300, 600))
+        intense_recirc = selfcal_timer <= 96
+
+        exterior = _clamp(self.exterior * 2, -64, 126)
+        interior = _clamp(self.interior * 5 - 126, -128, 126)
+        interior_delayed = _clamp(self.interior_delayed * 5 - 126, -128, 126)
+        ext_bias = _clamp(exterior - 50 + (self.dial[0] - self.dial[1]) // -4, -45, 34)
+        shift = -(((ext_bias + 1) // 2) + 7)
+        data = [0] * framing.data_len
+
+        for side in (0, 1):
+            if self.adjust_timer[side]:
+                self.adjust_elapsed[side] += dt
+                while self.adjust_elapsed[side] >= self.adjust_timer[side] and self.dial_damped[side] != self.dial[side]:
+                    self.adjust_elapsed[side] -= self.adjust_timer[side]
+                    self.dial_damped[side] += 1 if self.dial[side] > self.dial_damped[side] else -1
+                if self.dial_damped[side] == self.dial[side]:
+                    self.adjust_timer[side] = 0
+                    self.adjust_elapsed[side] = 0.0
+            target = _clamp(self.dial_damped[side] + shift, -128, 127)
+            control = _clamp(interior_delayed - target, -128, 127)
+            heater = _clamp(80 - 3.5 * control, 0, 255)
+            self.feedback_ref[side], self.feedback_elapsed[side] = _follow(
+                self.feedback_ref[side], heater, self.feedback_elapsed[side] + dt, 2, 5)
+            self.valve_ref[side], self.valve_elapsed[side] = _follow(
+                self.valve_ref[side], heater, self.valve_elapsed[side] + dt, 1, 3)
+            reference = units.feedbackTemp(self.feedback_ref[side])
+            feedback = _clamp((reference - self.mixing[side]) * 4, -128, 127)
+            duty = _clamp(self.valve_ref[side] * 2 + feedback, 0, 255) if self.water_pump else 0
+            mixing_target = self.evaporator + (self.coolant - self.evaporator) * duty / 255
+            self.mixing[side] += (mixing_target - self.mixing[side]) * dt / 20
+            data[side * 2] = self.dial[side]
+            data[1 + side * 2] = target
+            data[0x05 + side] = _clamp(self.mixing[side] * 4 - 48, 0, 243)
+            data[0x09 + side] = control
+            data[0x0c + side] = heater
+            data[0x0e + side] = self.feedback_ref[side]
+            data[0x10 + side] = self.valve_ref[side]
+            data[0x12 + side] = feedback
+            data[0x14 + side] = duty
+            data[0x1e + side * 2] = self.dial_damped[side]
+            data[0x1f + side * 2] = self.adjust_timer[side]
+
+        control = min(data[0x09], data[0x0a])
+        if control > 3:
+            self.cooling = True
+        elif max(data[0x09], data[0x0a]) < -7:
+            self.cooling = False
+        if control >= 17:
+            self.intense = True
+        elif control <= (2 if self_cal else 11):
+            self.intense = False
+
+        evaporator = _clamp(self.evaporator * 2, 0, 126)
+        if evaporator >= 14 and self.cooling and self.overheat_stage < 2:
+            self.compressor = True
+        elif evaporator <= 10 or not self.cooling or self.overheat_stage == 2:
+            self.compressor = False
+
+        coolant = _clamp(self.coolant, 0, 255)
+        if coolant >= 107:
+            self.radiator_blower = True
+        elif coolant <= 100:
+            self.radiator_blower = False
+        if coolant >= 127:
+            self.overheat_stage = 2
+        elif (self.overheat_stage == 2) and (coolant <= 122):
+            self.overheat_stage = 1
+        elif (self.overheat_stage == 0) and (coolant >= 122):
+            self.overheat_stage = 1
+        elif coolant <= 117:
+            self.overheat_stage = 0
+        if self.overheat_stage == 2:
+            self.overheat_count = 0x3e
+        elif self.overheat_stage == 1:
+            self.overheat_count = (self.overheat_count + 1) % 40
+        else:
+            self.overheat_count = 0
+
+        heater = max(data[0x0c], data[0x0d])
+        if heater >= 40:
+            self.water_pump = True
+        elif heater <= 21:
+            self.water_pump = False
+        water_pump = self.water_pump and not self_cal
+
+        recirc = self.intense and intense_recirc
+        if recirc and not self.recirc_timer:
+            self.recirc_timer = 20 if self.compressor else 5
+
+        data[0x04] = selfcal_timer
+        data[0x07] = interior
+        data[0x08] = exterior
+        data[0x0b] = ext_bias
+        data[0x16] = coolant
+        data[0x17] = evaporator
+        data[0x18] = (0x80 if self.overheat_stage == 2 else 0x40 if self.overheat_stage else 0) | self.overheat_count
+        data[0x19] = interior_delayed
+        data[0x1a] = ((1 << 3) if self.adjust_timer[0] else 0) | ((1 << 5) if self.adjust_timer[1] else 0) \
+            | (0 if self.intense else 1 << 6)   # 0x1a bit 6 is clear in intense cooling
+        data[0x1b] = self.recirc_timer if recirc else 0
+        data[0x1c] = (0 if self.intense else 1) | (2 if self.radiator_blower else 0) \
+            | (0x0c if recirc else 0) | (0x10 if self.compressor else 0) | (0x80 if water_pump else 0)
+        data[0x1d] = (0x20 if self.cooling else 0) | (0x40 if self_cal else 0) | (0x80 if intense_recirc else 0) \
+            | (0x10 if exterior >= 2 else 0)
+        for side in (0, 1):   # dial end stops
+            if self.dial[side] <= -128:
+                data[0x1d] |= 1 << (side * 2)
+            elif self.dial[side] >= 127:
+                data[0x1d] |= 2 << (side * 2)
+
+        self.time += dt
+        return fields.data_struct.pack(*data) + framing.sync_prefix + framing.sync_versions[:1]
+
+    def packets(self, count):
+        """This function returns count packets back to back."""
+        return b"".join(self.packet() for _ in range(count))
+
+
+class Corruptor:
+    """Damages packets at random: drops or inserts bytes, or replaces a
+       sync byte, each with its own probability per packet.
+    """
+    def __init__(self, drop=0.0, insert=0.0, sync=0.0, seed=None):
+        self.drop = drop
+        self.insert = insert
+        self.sync = sync
+        self.random = random.Random(seed)
+        self.damaged = 0   # number of packets damaged
+
+    def apply(self, packet):
+        rnd = self.random
+        damaged = False
+        if self.sync and rnd.random() < self.sync:
+            pos = rnd.randrange(framing.data_len, framing.packet_len)
+            packet = packet[:pos] + bytes((packet[pos] ^ rnd.randrange(1, 256),)) + packet[pos + 1:]
+            damaged = True
+        if self.drop and rnd.random() < self.drop:
+            pos = rnd.randrange(len(packet))
+            packet = packet[:pos] + packet[pos + 1:]
+            damaged = True
+        if self.insert and rnd.random() < self.insert:
+            pos = rnd.randrange(len(packet) + 1)
+            packet = packet[:pos] + bytes((rnd.randrange(256),)) + packet[pos:]
+            damaged = True
+        self.damaged += damaged
+        return packet
+
+# EOF
@@ -0,0 +1,82 @@
+# timestamps.py - packet timestamps of Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# A capture logged with tools/datalog.py -a has a sidecar file
+# <capture>.ts with the arrival time of every framed packet. The
+# capture itself stays a plain copy of the data stream.
+
+# Sidecar layout, little-endian:
+#   8 bytes  magic "MB124TS1"
+#   then for every packet:
+#     int64  source offset of the packet
+#     int64  time.monotonic_ns() when the packet was complete
+#     int64  time.time_ns() at the same moment
+
+import array
+import struct
+import sys
+
+
+timestamp_magic = b"MB124TS1"
+timestamp_record = struct.Struct("<qqq")
+
+
+def timestampName(filename):
+    return filename + ".ts"
+
+
+def packTimestamp(offset, monotonic_ns, wall_ns):
+    return timestamp_record.pack(offset, monotonic_ns, wall_ns)
+
+
+def loadTimestamps(filename):
+    """This function returns the offsets, monotonic times and wall clock
+       times in the timestamp sidecar of a capture as three arrays, or
+       None when the capture has no sidecar.
+    """
+    try:
+        with open(timestampName(filename), "rb") as tsfile:
+            if tsfile.read(len(timestamp_magic)) != timestamp_magic:
+                return None
+            data = tsfile.read()
+    except OSError:
+        return None
+    records = array.array("q")
+    records.frombytes(data[:len(data) - len(data) % timestamp_record.size])  # a partly written record is skipped
+    if sys.byteorder == "big":
+        records.byteswap()
+    return records[0::3], records[1::3], records[2::3]
+
+
+def packetTimes(filename, packets):
+    """This function returns the time in seconds of every packet of a
+       framed capture from its first packet, as measured when it was
+       logged, or None unless every packet has a timestamp.
+    """
+    stamps = loadTimestamps(filename)
+    if stamps is None or not len(packets):
+        return None
+    monotonic = dict(zip(stamps[0], stamps[1]))
+    try:
+        start = monotonic[packets.offsets[0]]
+        return [(monotonic[offset] - start) / 1e9 for offset in packets.offsets]
+    except KeyError:
+        return None
+
+# EOF
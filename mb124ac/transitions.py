@@ -0,0 +1,62 @@
+# transitions.py - bit and field transition search for Mercedes-Benz 124 A/C (SA 580) data stream captures
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# A masked column of the packet matrix is XORed with itself shifted by
+# one packet. Both are converted to big integers for this, so the XOR
+# of the whole column is a single operation, and the nonzero bytes of
+# the result, ie. the transitions, are found by the regular expression
+# engine.
+
+import re
+
+from . import index
+
+
+nonzero_pattern = re.compile(b"[^\x00]")
+
+
+def changePoints(column):
+    """This function returns the positions i in column where
+       column[i] differs from column[i - 1].
+    """
+    if len(column) < 2:
+        return []
+    diff = int.from_bytes(column[1:], "big") ^ int.from_bytes(column[:-1], "big")
+    diff = diff.to_bytes(len(column) - 1, "big")
+    return [match.start() + 1 for match in nonzero_pattern.finditer(diff)]
+
+
+def findTransitions(packets, col, mask=0xff):
+    """This function returns (packet number, old value, new value)
+       tuples for every change of the masked byte col.
+    """
+    column = index.maskedColumn(packets, col, mask)
+    return [(number, column[number - 1], column[number]) for number in changePoints(column)]
+
+
+def context(packets, number, columns, before=5, after=5):
+    """This function returns for each byte in columns the values of the
+       packets from number - before to number + after, clipped to the
+       capture.
+    """
+    first = max(number - before, 0)
+    last = min(number + after + 1, len(packets))
+    return {col: packets.column(col)[first:last] for col in columns}, first
+
+# EOF
@@ -0,0 +1,966 @@
+# ui.py - curses display of the Mercedes-Benz 124 A/C (SA 580) data stream decoder
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# The display of decoder.py: a packet is drawn field by field into
+# fixed places given by 'labels', only the fields that have changed
+# being redrawn, with the derived values, sparklines and state change
+# events around them. Packets come from a CaptureSource or a
+# LiveSource.
+
+# curses is imported with this module and pyserial only when a
+# LiveSource is opened, so the rest of the package, and decoding
+# captures into files, needs neither.
+
+# TODO:
+
+#   - Group user inputs together:
+#     1) reheat/EC/recirculation mode statuses
+#     2) temperature dial positions
+
+#   - Group temperature inputs in air flow sequence:
+#     1) exterior/air intake temperature
+#     2) evaporator temperature
+#     3) mixing chamber temperatures
+#     4) interior temperature
+
+#   - Group actuators controlled by, or controlling inputs near the
+#     values. Includes the "switch-on countdown" and "self-cal" status.
+
+import curses
+import time
+
+from . import derived, events, export, fields, framing, history, index, logwriter, replay, serialreader, units
+
+
+# Options of the display, set by decoder.py: the field seeked by with
+# n and p, the maximum number of screen updates per second (0 for an
+# update after every packet) and the packets per character of the
+# sparklines (0 hides them).
+event_field = fields.parseSelector("compressor")
+fps = 0
+trend_step = 10
+
+# State change events (intense cooling, recirculation, self-calibration
+# etc.) are tracked for every packet, independent of what is redrawn.
+event_tracker = events.EventTracker()
+
+# Derived signals (target deltas, rolling averages and rates) and the
+# text of each derived value currently on screen, see printDerived().
+derived_engine = derived.Engine()
+derived_cache = {}
+
+# List of cached bytes, each byte of a packet is copied to this list
+# for caching. It holds the bytes currently on screen, so only changed
+# fields are redrawn. Empty entries never match, which forces the first
+# packet to be drawn.
+byte_cache = [b""] * 0x29
+
+# Slowly changing values are followed with sparklines in a pane on the
+# right, when the terminal is wide enough: (data byte, label) of each.
+trend_fields = ((0x07, "Interior"),
+                (0x19, "Int. delayed"),
+                (0x08, "Exterior"),
+                (0x17, "Evaporator"),
+                (0x0e, "Feedback L"),
+                (0x0f, "Feedback R"),
+                (0x1b, "Recirc. timer"),
+                )
+trend_col = 97
+
+# the trend pane, a history.Sparkline of each of trend_fields and the
+# text currently on each line of the pane, see printTrends()
+trendwin = None
+sparklines = []
+trend_cache = {}
+
+# time.monotonic() of the latest screen update, see flushScreen()
+last_flush = 0.0
+
+# file the events are appended to, see -E
+event_log = None
+
+# publish.Publisher of the packets, see -P
+publisher = None
+
+# profiling.Profiler of the stages of mainLoop(), see --profile, and
+# the width of its status line
+profiler = None
+profile_width = 0
+
+ticker_line = 1
+ticker_col = 22
+
+xLeftLabel = 0
+xRightLabel = 52
+
+### labels
+
+# This may need further rebision. The concept is that the tuple called
+# 'labels' is to be indexed with the ticker counter to get appropriate
+# coordinated, labels, and everything for the data byte in question.
+
+# The first element in every top-level tuple is a bit-mask integer. It
+# is used to describe the existense of a label and other required
+# information. This is to be expanded as needed.
+
+# bit 0 = label — If this bit is set, the first nested tuple has a
+#         label to be printed. This is used to set a single label for
+#         value pairs where the other member of the pair has the label
+#         for the line.
+
+# bit 1 = bitmask — If this bit is set, the next nested tuple contains
+#         tuples for labels for each bit.
+
+# The label tuple has the following elements:
+
+# 0) int - line coordinate
+
+# 1) int - column coordinate for the label
+
+# 2) str - label text
+
+# 3) int - column coordinate for the value, relative to the label's
+#          column coordinate, can be negative to print value to the
+#          left of the label
+
+labels = ((0b01, ( 1, xLeftLabel,  "Temp dial  . . . . :", 21)), # 0x00 - temperature setting dial, left
+          (0b01, ( 9, xLeftLabel,  "Adjustment target  :", 21)), # 0x01 - temperature target, left
+          (0b00, ( 1, xLeftLabel,  ""                    , 34)), # 0x02 - temperature setting dial, right
+          (0b00, ( 9, xLeftLabel,  ""                    , 34)), # 0x03 - temperature target, right
+          (0b01, (23, xRightLabel, "Self-cal. timer  . :", 21)), # 0x04 - self-calibration timer a.k.a. switch-on countdown, ~10 minutes
+          (0b01, (18, xLeftLabel,  "Mixing chamber temp:", 22)), # 0x05 - mixing chamber temperature, left
+          (0b00, (18, xLeftLabel,  ""                    , 35)), # 0x06 - mixing chamber temperature, right
+          (0b01, ( 6, xLeftLabel,  "Interior air temp  :", 21)), # 0x07 - interior temperature, raw
+          (0b01, (15, xRightLabel, "Exterior air temp  :", 21)), # 0x08 - exterior temperature (cabin air intake)
+          (0b01, (11, xLeftLabel,  "Control (temp diff):", 21)), # 0x09 - temperature control, left
+          (0b00, (11, xLeftLabel,  ""                    , 34)), # 0x0a - temperature control, right
+          (0b01, (12, xLeftLabel,  "Ext. temp. bias  . :", 21)), # 0x0b - exterior/interior temperature control bias
+          (0b01, (14, xLeftLabel,  "Heater drive . . . :", 21)), # 0x0c - heater drive, left
+          (0b00, (14, xLeftLabel,  ""                    , 34)), # 0x0d - heater drive, right
+          (0b01, (16, xLeftLabel,  "^^ slow (feedback) :", 21)), # 0x0e - reference for temperature sensor (feedback), left
+          (0b00, (16, xLeftLabel,  ""                    , 34)), # 0x0f - reference for temperature sensor (feedback), right
+          (0b01, (15, xLeftLabel,  "^^ fast  . . . . . :", 21)), # 0x10 - reference for valve drive, left
+          (0b00, (15, xLeftLabel,  ""                    , 34)), # 0x11 - reference for valve drive, right
+          (0b01, (20, xLeftLabel,  "Valve feedback ctrl:", 21)), # 0x12 - valve feedback control, left
+          (0b00, (20, xLeftLabel,  ""                    , 34)), # 0x13 - valve feedback control, right
+          (0b01, (21, xLeftLabel,  "Valve duty cycle . :", 21)), # 0x14 - valve drive duty cycle, left
+          (0b00, (21, xLeftLabel,  ""                    , 34)), # 0x15 - valve drive duty cycle, right
+          (0b01, (18, xRightLabel, "Engine coolant . . :", 21)), # 0x16 - engine coolant temperature
+          (0b01, (16, xRightLabel, "Evaporator temp  . :", 21)), # 0x17 - evaporator temperature
+          (0b01, (20, xRightLabel, "Overheat protection:", 21)), # 0x18 - overheat protection status
+          (0b01, ( 7, xLeftLabel,  "Int.temp. (delayed):", 21)), # 0x19 - interior temperature, dampened
+          (0b11, (( 2, xRightLabel, "Recirculation  . . :", 21), # 0x1a/0 - user input: manual forced recirculation
+                  ( 1, xRightLabel, "Economy mode . . . :", 21), # 0x1a/1 - user input: economy = manual A/C off
+                  ( 0, xRightLabel, "Reheat mode  . . . :", 21), # 0x1a/2 - user input: reheat = manual A/C on
+                  ( 2, xLeftLabel,  ""                    , 21), # 0x1a/3 - user temperature adjustment, left
+                  ( 3, xRightLabel, "Mode change, user  :", 21), # 0x1a/4 - this is occasionally briefly set when changing modes
+                  ( 2, xLeftLabel,  ""                    , 34), # 0x1a/5 - user temperature adjustment, right
+                  ( 5, xRightLabel, "Intense cooling  . :", 21), # 0x1a/6 - intense cooling mode
+                  (25, xLeftLabel,  "0x1a / 7 . . . . . :", 21), # 0x1a/7
+                  )
+           ),
+          (0b01, ( 8, xRightLabel, "Recirculation timer:       min.", 21)), # 0x1b - recirculation timer
+          (0b11, ((12, xRightLabel, "Center vents heat  :", 21), # 0x1c/0 - center vents temp control: 0 = heating bypassed; 1 = heated
+                  (19, xRightLabel, "Radiator blower II :", 21), # 0x1c/1 - radiator blower, second stage
+                  ( 0, xRightLabel, ""                    , 21), # 0x1c/2 - 100% recirculation
+                  ( 9, xRightLabel, "Recirculation mode :", 21), # 0x1c/3 -  80% recirculation
+                  (13, xRightLabel, "A/C Compressor . . :", 21), # 0x1c/4 - A/C compressor request
+                  (26, xLeftLabel,  "0x1c / 5 . . . . . :", 21), # 0x1c/5
+                  (27, xLeftLabel,  "0x1c / 6 . . . . . :", 21), # 0x1c/6
+                  (22, xLeftLabel,  "Water pump . . . . :", 31), # 0x1c/7 - water recirculation pump
+                  )
+           ),
+          (0b11, (( 0, xLeftLabel,  ""                    , 21), # 0x1d/0 - max cooling, left
+                  ( 0, xLeftLabel,  ""                    , 21), # 0x1d/1 - defrost, left
+                  ( 0, xLeftLabel,  ""                    , 34), # 0x1d/2 - max cooling, right
+                  ( 0, xLeftLabel,  ""                    , 34), # 0x1d/3 - defrost, right
+                  (14, xRightLabel, "Exterior air . . . :", 21), # 0x1d/4 - exterior air (non-)freeze
+                  (11, xRightLabel, "Temp control mode  :", 21), # 0x1d/5 - control mode: 0 = heating; 1 = cooling
+                  (22, xRightLabel, "Self-calibration . :", 21), # 0x1d/6 - self-calibration
+                  ( 6, xRightLabel, "^^ recirculation . :", 21), # 0x1d/7 - intense cooling mode auto-recirculation
+                  )
+           ),
+          (0b01, ( 3, xLeftLabel,  "^^ dampened  . . . :", 21)), # 0x1e - temperature dial, left - dampened value
+          (0b01, ( 4, xLeftLabel,  "adjustment timer . :", 21)), # 0x1f - temperature dial, left - adjustment timer
+          (0b01, ( 3, xLeftLabel,  ""                    , 34)), # 0x20 - temperature dial, right - dampened value
+          (0b01, ( 4, xLeftLabel,  ""                    , 34)), # 0x21 - temperature dial, right - adjustment timer
+          )
+
+
+def logtime():
+    return time.strftime("%H:%M:%S : ")
+
+
+def getCol(ticker, bit=0):
+    """This function returns the column number for a value from the
+       label structure.
+    """
+    if labels[ticker][0] & 2:
+        return labels[ticker][1][bit][1] + labels[ticker][1][bit][3]
+    else:
+        return labels[ticker][1][1] + labels[ticker][1][3]
+
+
+def getLine(ticker, bit=0):
+    """This function returns the line number for a value from the label
+       structure.
+    """
+    if labels[ticker][0] & 2:
+        return labels[ticker][1][bit][0]
+    else:
+        return labels[ticker][1][0]
+
+
+# Derived values are printed under the values they are derived from:
+# (line, column, label, names of the derived values, function
+# returning the text for the values). Rates are shown per minute.
+derived_labels = ((getLine(0x01) + 1, getCol(0x01), "",
+                   ("target_delta_left", "target_delta_left_c", "target_delta_right", "target_delta_right_c"),
+                   lambda left, left_c, right, right_c: f"{left:+4d} {left_c:+5.1f}°  {right:+4d} {right_c:+5.1f}°"),
+                  (getLine(0x0b) + 1, getCol(0x0b), "", ("ext_bias_delta",),
+                   lambda delta: f"{delta:4d} / {(50 - delta):+4d}"),
+                  (getLine(0x19) + 1, getCol(0x19) + 7, "^^ 1 min. average  :", ("interior_mean_c",),
+                   lambda mean: f"{mean:5.1f} °C"),
+                  (getLine(0x0e) + 1, getCol(0x0e) + 5, "^^ change per min. :", ("feedback_ref_left_rate", "feedback_ref_right_rate"),
+                   lambda left, right: f"{(left * 60):+6.2f}°      {(right * 60):+6.2f}°"),
+                  (getLine(0x05) + 1, getCol(0x05) + 4, "^^ 1 min. average  :", ("mixing_left_mean_c", "mixing_right_mean_c"),
+                   lambda left, right: f"{left:6.2f}°      {right:6.2f}°"),
+                  )
+
+
+def printDerived(outwin):
+    """This function prints the derived values that have changed."""
+    for line, col, label, names, text in derived_labels:
+        text = text(*[derived_engine.value(name) for name in names])
+        if derived_cache.get(line) != text:
+            outwin.addstr(line, col, text, curses.color_pair(5))
+            derived_cache[line] = text
+
+
+def printByte(outwin, packet, ticker):
+    rawi = packet.ints[ticker]
+    match ticker:
+        case 0x00 | 0x02:  # temperature setting dial, left and right
+            if rawi < -33:
+                colour = curses.color_pair(1)
+            elif rawi > -1:
+                colour = curses.color_pair(2)
+            else:
+                colour = curses.A_REVERSE
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} ")
+            outwin.addstr(f"{packet.engineering(ticker):5.1f}° ", colour)
+
+        case 0x01 | 0x03:  # temperature adjustment target, left and right
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} ")
+            outwin.addstr(f"{packet.engineering(ticker):5.1f}°")
+
+        case 0x04: # self-calibration timer a.k.a. switch-on countdown
+            minutes, seconds = units.selfcalTime(rawi)
+            colour = 0
+            if rawi:
+                colour = curses.color_pair(3)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} ", colour)
+            if rawi:
+                outwin.addstr(f"  {minutes:2d} min. {seconds:2d} s")
+            else:
+                outwin.addstr("               ")
+
+        case 0x05 | 0x06:  # mixing chamber temperature, left and right
+            colour = 0
+            if not rawi:
+                colour = curses.color_pair(1)
+            elif rawi > 242:
+                colour = curses.color_pair(2)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:3d} ")
+            outwin.addstr(f"{packet.engineering(ticker):6.2f}° ", colour)
+
+        case 0x07 | 0x19: # interior temperature, raw and dampened/delayed
+            colour = 0
+            if (rawi < -127) or (rawi > 125):
+                colour = curses.color_pair(3)
+            elif (rawi < -56):
+                colour = curses.color_pair(1)
+            elif (rawi > 24):
+                colour = curses.color_pair(2)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} = ")
+            outwin.addstr(f"{packet.engineering(ticker):5.1f} °C ", colour)
+
+        case 0x08: # exterior temperature
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{packet.exterior_c:6.1f} °C  ({rawi:4d})")
+
+        case 0x09 | 0x0a:  # temperature control, left and right
+            if (rawi < -50):
+                colour = curses.color_pair(2)
+            elif (rawi > 23):
+                colour = curses.color_pair(1)
+            elif (rawi < -7):
+                colour = curses.color_pair(7) + curses.A_BOLD
+            elif (rawi > 3):
+                colour = curses.color_pair(6) + curses.A_BOLD
+            else:
+                colour = 0
+            outwin.addstr(getLine(ticker),  getCol(ticker), f"{rawi:+4d} ", colour)
+            outwin.addstr(f"{packet.engineering(ticker):+5.1f}°")
+
+        case 0x0b: # exterior temperature bias
+            if (rawi < -15):
+                colour = curses.color_pair(2)
+            elif (rawi > -14):
+                colour = curses.color_pair(1)
+            else:
+                colour = curses.color_pair(4)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:+4d} = ")
+            outwin.addstr(f"{packet.ext_bias_target_c:+5.1f} °C ", colour)
+            outwin.addstr(f"{packet.ext_bias_c:+5.1f} °C")
+
+        case 0x0c | 0x0d:  # heater drive, left and right
+            if (rawi < 80):
+                colour = curses.color_pair(1)
+            elif (rawi > 80):
+                colour = curses.color_pair(2)
+            else:
+                colour = curses.color_pair(4)
+            outwin.addstr(getLine(ticker),  getCol(ticker), f" {rawi:3d} ", colour)
+            outwin.addstr(f"{packet.engineering(ticker):4d}")
+
+        case 0x0e | 0x0f:  # mixing chamber temperature reference, left and right
+            outwin.addstr(getLine(ticker), getCol(ticker), f" {rawi:3d} {packet.engineering(ticker):6.2f}°")
+
+        case 0x10 | 0x11:  # valve drive reference, left and right
+            outwin.addstr(getLine(ticker), getCol(ticker), f" {rawi:3d} {packet.engineering(ticker):4d}")
+
+        case 0x12 | 0x13:  # valve control bias (feedback), left and right
+            if (rawi < 0):
+                colour = curses.color_pair(2)
+            elif (rawi > 0):
+                colour = curses.color_pair(1)
+            else:
+                colour = curses.color_pair(4)
+            outwin.addstr(getLine(ticker), getCol(ticker) + 2, f"{rawi:+5d} ", colour)
+
+        case 0x14 | 0x15:  # valve drive duty cycle, left and right
+            colour = 0
+            if rawi == 0x00:
+                colour = curses.color_pair(1)
+            elif rawi == 0xff:
+                colour = curses.color_pair(2)
+            outwin.addstr(getLine(ticker),  getCol(ticker), f"{rawi:4d} {packet.engineering(ticker):5.1f}% ", colour)
+
+        case 0x16: # coolant temperature
+            colour = 0
+            if rawi < 6:
+                colour = curses.color_pair(1)
+            elif rawi > 107:
+                colour = curses.color_pair(2)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} ", colour)
+            outwin.addstr(f"  °C")
+
+        case 0x17: # evaporator temperature
+            tempf = packet.evaporator_c
+            colour = 0
+            if not tempf:
+                colour = curses.color_pair(1)
+            elif rawi > 125:
+                colour = curses.color_pair(2)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{tempf:6.1f} ", colour)
+            outwin.addstr(f"°C  ({rawi:4d})")
+
+        case 0x18: # overheat protection status
+            colour = 0
+            st_count = packet.overheat_count
+            if rawi:
+                colour = curses.color_pair(3)
+                if st_count > 19:
+                    colour = curses.color_pair(2)
+            if packet.overheat_stage:
+                st_mode = f"Stage {packet.overheat_stage}"
+            else:
+                st_mode = "off    "
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{st_count:4d} ", colour)
+            outwin.addstr(f" ({st_mode})")
+
+        case 0x1a:  # user input
+            if packet.recirc_user:   # bit 0 - recirculation (user)
+                outwin.addstr(getLine(ticker, 0), getCol(ticker, 0), "  on ", curses.color_pair(3))
+            else:
+                outwin.addstr(getLine(ticker, 0), getCol(ticker, 0), " off ")
+
+            if packet.economy:   # bit 1 - economy mode (user)
+                outwin.addstr(getLine(ticker, 1), getCol(ticker, 1), "  on ", curses.color_pair(4))
+            else:
+                outwin.addstr(getLine(ticker, 1), getCol(ticker, 1), " off ")
+
+            if packet.reheat:   # bit 2 - reheat mode (user)
+                outwin.addstr(getLine(ticker, 2), getCol(ticker, 2), "  on ", curses.color_pair(1))
+            else:
+                outwin.addstr(getLine(ticker, 2), getCol(ticker, 2), " off ")
+
+            if packet.adjusting_left:   # bit 3
+                status = "Adjusting"
+            else:
+                status = "         "
+            outwin.addstr(getLine(ticker, 3), getCol(ticker, 3), status)
+
+            if packet.mode_change:   # bit 4 - mode change, user
+                colour = curses.color_pair(3)
+                status = "  on "
+            else:
+                colour = 0
+                status = " off "
+            outwin.addstr(getLine(ticker, 4), getCol(ticker, 4), status, colour)
+
+            if packet.adjusting_right:   # bit 5
+                status = "Adjusting"
+            else:
+                status = "         "
+            outwin.addstr(getLine(ticker, 5), getCol(ticker, 5), status)
+
+            if not packet.intense_cooling:   # bit 6 - intense cooling
+                outwin.addstr(getLine(ticker, 6), getCol(ticker, 6), " off ")
+            else:
+                outwin.addstr(getLine(ticker, 6), getCol(ticker, 6), "  on ", curses.color_pair(1))
+
+            if packet.x1a_7:   # bit 7
+                status = "1 /  set"
+            else:
+                status = "0 / unset"
+            outwin.addstr(getLine(ticker, 7), getCol(ticker, 7), status)
+
+        case 0x1b: # recirculation timer
+            colour = 0
+            if rawi:
+                colour = curses.color_pair(4)
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} ", colour)
+
+        case 0x1c:  # actuator control
+            if packet.center_vents_heat:   # bit 0
+                colour = 0
+                status = "controlled"
+            else:
+                colour = curses.color_pair(1)
+                status = " bypassed "
+            outwin.addstr(getLine(ticker, 0), getCol(ticker, 0), status, colour)
+
+            if packet.radiator_blower_2:   # bit 1 - radiator blower stage II
+                outwin.addstr(getLine(ticker, 1), getCol(ticker, 1), "  on ", curses.color_pair(2))
+            else:
+                outwin.addstr(getLine(ticker, 1), getCol(ticker, 1), " off ")
+
+            if packet.recirc_100:   # bit 2 - recirculation, full
+                outwin.addstr(getLine(ticker, 3), getCol(ticker, 3), " 100% ", curses.color_pair(3))
+            elif packet.recirc_80: # bit 3 - recirculation, partial
+                outwin.addstr(getLine(ticker, 3), getCol(ticker, 3), "  80% ", curses.color_pair(3))
+            else:
+                outwin.addstr(getLine(ticker, 3), getCol(ticker, 3), " off  ")
+
+            if packet.compressor:   # bit 4 - compressor enable
+                outwin.addstr(getLine(ticker, 4), getCol(ticker, 4), "  on ", curses.color_pair(1))
+            else:
+                outwin.addstr(getLine(ticker, 4), getCol(ticker, 4), " off ")
+
+            if packet.x1c_5:   # bit 5
+                status = "1 /   set"
+            else:
+                status = "0 / unset"
+            outwin.addstr(getLine(ticker, 5), getCol(ticker, 5), status)
+
+            if packet.x1c_6:   # bit 6
+                status = "1 /   set"
+            else:
+                status = "0 / unset"
+            outwin.addstr(getLine(ticker, 6), getCol(ticker, 6), status)
+
+            if packet.water_pump:   # bit 7 - water pump
+                outwin.addstr(getLine(ticker, 7), getCol(ticker, 7), " on ", curses.color_pair(2))
+            else:
+                outwin.addstr(getLine(ticker, 7), getCol(ticker, 7), "off ")
+
+        case 0x1d:  # temperature control
+            if packet.max_cold_left:   # bit 0
+                outwin.addstr(getLine(ticker, 0), getCol(ticker, 0), " Max cold ", curses.color_pair(1))
+            elif packet.defrost_left: # bit 1
+                outwin.addstr(getLine(ticker, 1), getCol(ticker, 1), " Defrost  ", curses.color_pair(2))
+            elif (rawi & 0x03): # bits 0 and 1 should never be set at the same time!
+                outwin.addstr(getLine(ticker, 0), getCol(ticker, 0), "( ?????? )")
+            else:
+                outwin.addstr(getLine(ticker, 0), getCol(ticker, 0), "Controlled")
+
+            if packet.max_cold_right:   # bit 2
+                outwin.addstr(getLine(ticker, 2), getCol(ticker, 2), " Max cold ", curses.color_pair(1))
+            elif packet.defrost_right: # bit 3
+                outwin.addstr(getLine(ticker, 3), getCol(ticker, 3), " Defrost  ", curses.color_pair(2))
+            elif (rawi & 0x0c): # bits 2 and 3 should never be set at the same time!
+                outwin.addstr(getLine(ticker, 2), getCol(ticker, 2), "( ?????? )")
+            else:
+                outwin.addstr(getLine(ticker, 2), getCol(ticker, 2), "Controlled")
+
+            if packet.ext_non_freezing:   # bit 4
+                status = "non-freezing"
+            else:
+                status = "freezing    "
+            outwin.addstr(getLine(ticker, 4), getCol(ticker, 4), status)
+
+            if packet.cooling_mode:   # bit 5 - temperature control mode
+                colour = curses.color_pair(1)
+                status = " cooling "
+            else:
+                colour = curses.color_pair(2)
+                status = " heating "
+            outwin.addstr(getLine(ticker, 5), getCol(ticker, 5), status, colour)
+
+            if packet.self_cal:   # bit 6 - self-calibration
+                outwin.addstr(getLine(ticker, 6), getCol(ticker, 6), "  on ", curses.color_pair(3))
+            else:
+                outwin.addstr(getLine(ticker, 6), getCol(ticker, 6), " off ")
+
+
+            if packet.intense_recirc:   # bit 7 - intense cooling recirculation
+                status = " enabled"
+            else:
+                status = " off    "
+            outwin.addstr(getLine(ticker, 7), getCol(ticker, 7), status)
+
+        case 0x1e | 0x20:  # temperature dial value, dampened, left and right
+            outwin.addstr(getLine(ticker), getCol(ticker), f"{rawi:4d} ")
+            outwin.addstr(f"{packet.engineering(ticker):5.1f}°")
+
+        case 0x1f | 0x21:  # adjustment interval, left and right
+            if rawi:
+                colour = curses.color_pair(3)
+                timerstring = f"{rawi:4d} s. "
+            else:
+                colour = 0
+                timerstring = " (off)  "
+            outwin.addstr(getLine(ticker), getCol(ticker), timerstring, colour)
+
+
+def printLabels (outwin, labels):
+    for label in labels:
+        if label[0] & 1:
+            if label[0] & 2:  # bit mask labels
+                for i in range(0, 8):
+                    (line, col, lab, dummy) = label[1][i]
+                    if lab != "":
+                        outwin.addstr(line, col, lab)
+            else:
+                (line, col, lab, dummy) = label[1]
+                outwin.addstr(line, col, lab)
+
+
+def updTicker (ticker, window):
+    if (ticker > 0x21):
+        tickch = 's'
+    elif (ticker % 5):
+        tickch = '.'
+    else:
+        tickch = ':'
+
+    if not ticker:
+        window.chgat(ticker_line, ticker_col + 0x28, 1, 0)
+    window.addstr(ticker_line, ticker_col + ticker, tickch, curses.color_pair(4))
+    window.chgat(ticker_line, ticker_col + ticker - 1, 1, 0)
+
+
+class CaptureSource:
+    """Packets framed from a capture file using its packet index, or
+       read from a capture archive, replayed on a drift-free schedule.
+       When drawing can't keep up, late packets are skipped.
+    """
+    live = False
+
+    def __init__(self, filename, interval, speed, cache=True):
+        self.filename = filename
+        self.cache = cache    # whether the packet index is kept in a sidecar file
+        self.clock = replay.ReplayClock(interval, speed)
+        self.packets = framing.Packets()
+        self.position = 0
+        self.size = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        self.packets = index.openCapture(self.filename, self.cache)
+        self.size = index.captureSize(self.filename)
+        self.clock.reset(0)
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def atEnd(self):
+        return self.position >= len(self.packets)
+
+    def dropped(self):
+        return self.size - len(self.packets.data)
+
+    def get(self, timeout):
+        if self.atEnd():
+            time.sleep(timeout)
+            return None
+        if not self.clock.wait(self.position, timeout):
+            return None
+        current = self.clock.current()
+        if (current is not None) and (current > self.position):  # behind schedule
+            current = min(current, len(self.packets) - 1)
+            self.skipped += current - self.position
+            self.position = current
+        item = (self.position, self.packets.offsets[self.position], self.packets[self.position], time.monotonic())
+        self.position += 1
+        return item
+
+    def seek(self, count):
+        self.goto(self.position + count)
+
+    def goto(self, number):
+        self.position = min(max(number, 0), len(self.packets))
+        self.clock.reset(self.position)
+
+    def changeSpeed(self, key):
+        if key == ord('+'):
+            self.clock.faster(self.position)
+        elif key == ord('-'):
+            self.clock.slower(self.position)
+        else:
+            self.clock.setSpeed(1, self.position)
+
+    def status(self):
+        return f"speed: {self.clock.describe():>5s}  skipped: {self.skipped:6d}"
+
+    def gotoTime(self, seconds):
+        self.goto(index.packetAtTime(self.packets, seconds))
+
+    def gotoChange(self, forward, field):
+        current = max(self.position - 1, 0)  # the packet on screen
+        if forward:
+            number = index.nextChange(self.packets, current, *field)
+        else:
+            number = index.prevChange(self.packets, current, *field)
+        if number is not None:
+            self.goto(number)
+
+
+class LiveSource:
+    """Packets framed from a serial line by a reader thread."""
+    live = True
+
+    def __init__(self, port, baudrate, record="", record_packets=""):
+        self.port = port
+        self.baudrate = baudrate
+        self.record = record
+        self.record_packets = record_packets
+        self.serial = None
+        self.reader = None
+        self.recorder = None
+        self.count = 0
+
+    def __enter__(self):
+        import serial
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=0.1)
+        if (self.record != "") or (self.record_packets != ""):
+            self.recorder = logwriter.Recorder(self.record, self.record_packets)
+        self.reader = serialreader.SerialReader(self.serial, recorder=self.recorder, profiler=profiler)
+        self.reader.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.reader.stop()
+        self.serial.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        return False
+
+    def atEnd(self):
+        return False
+
+    def dropped(self):
+        return self.reader.framer.stats.dropped
+
+    def get(self, timeout):
+        if self.reader.error is not None:
+            raise self.reader.error
+        if (self.recorder is not None) and (self.recorder.error() is not None):
+            raise self.recorder.error()
+        item = self.reader.get(timeout)
+        if item is None:
+            return None
+        self.count += 1
+        return (self.count - 1,) + item
+
+    def seek(self, count):
+        pass
+
+    def goto(self, number):
+        pass
+
+    def gotoTime(self, seconds):
+        pass
+
+    def gotoChange(self, forward, field):
+        pass
+
+    def changeSpeed(self, key):
+        pass
+
+    def status(self):
+        status = f"overflows: {self.reader.overflows:6d}  recovered: {self.reader.framer.stats.recovered:5d}"
+        if self.recorder is not None:
+            return status + f"  rec: {self.recorder.written() // 1024:6d} kB"
+        return status
+
+
+def clearTrends ():
+    """This function starts the sparklines over, after a seek in a
+       capture. Packets skipped by a fast replay don't clear them.
+    """
+    for sparkline in sparklines:
+        sparkline.clear()
+
+
+def printTrends (packet):
+    """This function adds a packet to the sparklines and redraws the
+       lines of the trend pane that have changed.
+    """
+    width = sparklines[0].means.size
+    for line, ((col, label), sparkline) in enumerate(zip(trend_fields, sparklines)):
+        value = packet.engineering(col)
+        unit = fields.fields[col].unit
+        if sparkline.append(value):
+            trendwin.addstr(2 * line + 1, 0, f"{sparkline.text:<{width}s}", curses.color_pair(5))
+        text = f"{label:13s}{value:6.1f} {unit}"
+        scale = f"{sparkline.low:.1f}..{sparkline.high:.1f}"
+        if len(text) + len(scale) < width:  # the scale of the bars if it fits
+            text = f"{text:<{width - len(scale)}s}{scale}"
+        text = text[:width]
+        if trend_cache.get(line) != text:
+            trendwin.addstr(2 * line, 0, f"{text:<{width}s}")
+            trend_cache[line] = text
+
+
+def printPacket (stdscr, outwin, msgwin, packet, source, arrival=None):
+    """This function draws a packet. arrival is the time.monotonic() it
+       was read from a serial line, or None for a capture, which is
+       timed by the packet interval.
+    """
+    for ticker in range(0x22):  # redraw only the fields that have changed
+        byte = packet.raw[ticker:ticker + 1]
+        if byte != byte_cache[ticker]:
+            printByte(outwin, packet, ticker)
+            byte_cache[ticker] = byte
+
+    for tick, value in enumerate(packet.raw[0x22:], start=1):
+        byte = packet.raw[0x21 + tick:0x22 + tick]
+        if byte != byte_cache[0x21 + tick]:
+            outwin.addstr(26, xRightLabel - 3 + (3 * tick), f"{value:02x}")
+            outwin.addstr(27, xRightLabel - 4 + (3 * tick), f"{value:3d}")
+            byte_cache[0x21 + tick] = byte
+
+    derived_engine.update(packet, arrival)
+    printDerived(outwin)
+    if trendwin is not None:
+        printTrends(packet)
+    outwin.addstr(28, xRightLabel, f"dropped: {source.dropped():8d} bytes")
+
+    for event in event_tracker.update(packet, time.time()):
+        msgwin.addstr(logtime() + event.message + "\n")
+        if event_log is not None:
+            export.writeJsonl((event.asDict(),), event_log)
+            event_log.flush()
+
+    stdscr.addstr(1, 2, "Synchronised.      ")
+    if not source.live:
+        stdscr.addstr(1, 68, f"pos: {packet.offset:8d} #{packet.number:<7d}")
+    stdscr.addstr(2, 68, source.status())
+    if publisher is not None:
+        stdscr.addstr(2, 2, f"clients: {len(publisher.clients()):3d}  dropped: {publisher.dropped():6d}")
+    updTicker(packet.number % framing.packet_len, stdscr)
+
+
+def flushScreen (stdscr, outwin, msgwin, force=False):
+    """This function copies all pending changes to the terminal at once,
+       at most fps times per second unless forced. It returns True
+       if the terminal was updated.
+    """
+    global last_flush
+    now = time.monotonic()
+    if (not force) and fps and (now - last_flush) < (1 / fps):
+        return False
+    last_flush = now
+    stdscr.noutrefresh()
+    outwin.noutrefresh()
+    msgwin.noutrefresh()
+    if trendwin is not None:
+        trendwin.noutrefresh()
+    curses.doupdate()
+    return True
+
+
+def printProfile (stdscr):
+    """This function prints the stage timings on the bottom border."""
+    global profile_width
+    text = f" {profiler.status()} "[:curses.COLS - 6]
+    stdscr.addstr(curses.LINES - 1, 3, text)
+    if len(text) < profile_width:
+        stdscr.hline(curses.LINES - 1, 3 + len(text), curses.ACS_HLINE, profile_width - len(text))
+    profile_width = len(text)
+
+
+# keys to seek back and forth by 60 and 10 packets in a capture file
+seek_keys = {ord('h'): -60, ord('j'): -10, ord('k'): 10, ord('l'): 60}
+
+
+def makeWindows (stdscr):
+    """This function returns the packet and message windows with the
+       labels printed.
+    """
+    outwin = stdscr.subwin(curses.LINES - 4, curses.COLS - 4, 3, 2)
+    msgwin = outwin.subpad(9, 80, 33, 2)
+    printLabels(outwin, labels)
+    for line, col, label, names, text in derived_labels:
+        if label != "":
+            outwin.addstr(line, xLeftLabel, label)
+    outwin.addstr(25, xRightLabel, "Sync bytes")
+    outwin.scrollok(True)
+    msgwin.scrollok(True)
+    makeTrends(stdscr)
+    return outwin, msgwin
+
+
+def makeTrends (stdscr):
+    """This function creates the trend pane if enabled and the terminal
+       is wide enough.
+    """
+    global trendwin, sparklines
+    width = curses.COLS - trend_col - 2
+    if (trend_step <= 0) or (width < 16) or (curses.LINES < 2 * len(trend_fields) + 4):
+        return
+    trendwin = stdscr.subwin(2 * len(trend_fields), width, 3, trend_col)
+    sparklines = [history.Sparkline(width - 1, trend_step) for col, label in trend_fields]
+
+
+def mainLoop (stdscr, source):
+    outwin, msgwin = makeWindows(stdscr)
+    stdscr.addstr(1, 2, "Waiting for data...")
+    flushScreen(stdscr, outwin, msgwin, True)
+
+    # Keys are read from an empty 1x1 window in the blank margin. The
+    # implicit refresh of getch() then doesn't flush anything else, so
+    # all screen updates go through flushScreen().
+    keywin = curses.newwin(1, 1, 1, 1)
+    keywin.nodelay(True)
+
+    count = 0  # numeric prefix for g and t
+    arrival = None   # earliest arrival of the packets not yet on screen
+    last_profile = 0.0
+    with source:
+        while True:
+            inputKey = keywin.getch()
+            if inputKey == ord('q'):
+                return
+            if ord('0') <= inputKey <= ord('9'):
+                count = count * 10 + inputKey - ord('0')
+            elif inputKey == 27:  # escape
+                count = 0
+            elif inputKey != -1:
+                seeked = True
+                if inputKey in seek_keys:
+                    source.seek(seek_keys[inputKey])
+                elif inputKey == ord('g'):  # go to packet
+                    source.goto(count)
+                elif inputKey == ord('t'):  # go to time in seconds
+                    source.gotoTime(count)
+                elif inputKey == ord('n'):  # next change of the event field
+                    source.gotoChange(True, event_field)
+                elif inputKey == ord('p'):  # previous change of the event field
+                    source.gotoChange(False, event_field)
+                elif (inputKey == ord('r')) and source.atEnd():
+                    source.goto(0)
+                else:
+                    seeked = False
+                    if inputKey in (ord('+'), ord('-'), ord('=')):  # replay speed
+                        source.changeSpeed(inputKey)
+                if seeked and not source.live:
+                    clearTrends()
+                    derived_engine.reset()
+                count = 0
+
+            item = source.get(0.1)
+            if item is None:
+                if source.atEnd():
+                    stdscr.addstr(1, 2, "EOF. r to restart. ")
+                else:
+                    stdscr.addstr(1, 2, "Waiting for data...")
+                flushScreen(stdscr, outwin, msgwin, True)
+                continue
+
+            if profiler is not None:
+                mark = time.perf_counter()
+                profiler.add("queue", time.monotonic() - item[3])
+                if arrival is None:
+                    arrival = item[3]
+            packet = fields.decodePacket(item[2], item[0], item[1])
+            if profiler is not None:
+                mark = profiler.lap("decode", mark)
+            if publisher is not None:
+                publisher.publish(packet, time.time())
+                if profiler is not None:
+                    mark = profiler.lap("publish", mark)
+            printPacket(stdscr, outwin, msgwin, packet, source, item[3] if source.live else None)
+            if count:
+                stdscr.addstr(1, 2, f"Go to: {count:<12d}")
+            if profiler is not None:
+                mark = profiler.lap("draw", mark)
+                profiler.count("packets")
+                if time.monotonic() - last_profile >= 1.0:
+                    last_profile = time.monotonic()
+                    printProfile(stdscr)
+            if flushScreen(stdscr, outwin, msgwin) and (profiler is not None):
+                profiler.lap("refresh", mark)
+                profiler.add("latency", time.monotonic() - arrival)
+                profiler.count("screen updates")
+                arrival = None
+
+
+def initScreen (stdscr):
+    curses.start_color()
+    curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_BLUE)
+    curses.init_pair(2, curses.COLOR_WHITE, curses.COLOR_RED)
+    curses.init_pair(3, curses.COLOR_BLACK, curses.COLOR_YELLOW)
+    curses.init_pair(4, curses.COLOR_BLACK, curses.COLOR_GREEN)
+    curses.init_pair(5, curses.COLOR_CYAN, curses.COLOR_BLACK)
+    curses.init_pair(6, curses.COLOR_BLUE, curses.COLOR_BLACK)
+    curses.init_pair(7, curses.COLOR_RED, curses.COLOR_BLACK)
+
+    stdscr.clear()
+    stdscr.border()
+    stdscr.addstr(0, 3, " Mercedes-Benz BR 124 A/C data stream decoder - press q to quit ")
+    stdscr.nodelay(True)
+    curses.curs_set(0)
+
+
+def main (stdscr, source):
+    initScreen(stdscr)
+    mainLoop(stdscr, source)
+
+
+def run (source):
+    """This function shows the packets of a CaptureSource or LiveSource
+       on the terminal until q is pressed.
+    """
+    curses.wrapper(main, source)
+
+# EOF
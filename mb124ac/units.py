@@ -0,0 +1,101 @@
+# units.py - raw value conversions for Mercedes-Benz 124 A/C (SA 580) data streams
+
+#    Copyright (C) 2023-2024  Lauri "Archyx" Lindholm
+
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+# ------------------------------------------------------------------------------
+
+# The formulas here are documented in doc/datastream.org. Functions
+# taking a signed value expect the result of signedByte().
+
+
+def signedByte(raw) -> int:
+    """This function returns a byte value between 0x00 and 0xff as a
+       signed integer between -128 and +127.
+    """
+    return raw - 256 if raw > 127 else raw
+
+
+def percent(raw) -> float:
+    """This function returns a float between 0 and 100 from a byte
+       value between 0x00 and 0xff.
+    """
+    return 100 * raw / 255
+
+
+def dialTemp(signed) -> float:
+    """Temperature dials, adjustment targets and interior temperatures
+       in °C.
+    """
+    return (signed + 126) / 5
+
+
+def mixingTemp(raw) -> float:
+    """Mixing chamber temperature in °C."""
+    return (raw + 48) / 4
+
+
+def halfDegrees(signed) -> float:
+    """Exterior and evaporator temperatures in °C."""
+    return signed / 2
+
+
+def fifthDegrees(signed) -> float:
+    """Temperature control values and exterior temperature bias in °C."""
+    return signed / 5
+
+
+def biasTarget(signed) -> float:
+    """The shift from user-requested temperature to adjustment target
+       caused by the exterior temperature bias, in °C.
+    """
+    return -1 * (((signed + 1) // 2) + 7) / 5
+
+
+def driveDelta(raw) -> int:
+    """Heater drive and valve drive reference relative to the balance
+       point of 80.
+    """
+    return raw - 80
+
+
+def feedbackTemp(raw) -> float:
+    """Heater feedback reference in °C."""
+    return raw / 4 + 10
+
+
+def selfcalTime(raw):
+    """This function returns the self-calibration timer as a tuple of
+       minutes and seconds left.
+    """
+    return raw // 12, (raw % 12) * 5
+
+
+def overheatCount(raw) -> int:
+    """Overheat protection counter, bits 0-5 of 0x18."""
+    return raw & 0x3f
+
+
+def overheatStage(raw) -> int:
+    """Overheat protection stage from bits 6 and 7 of 0x18, 0 when
+       off.
+    """
+    if raw & 0x80:
+        return 2
+    if raw & 0x40:
+        return 1
+    return 0
+
+# EOF
@@ -0,0 +1,221 @@
+#!/bin/python3
+import argparse
+import json
+import os
+import platform
+import pty
+import select
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import archive, fields, framing, synth
+
+parser = argparse.ArgumentParser(description="program to benchmark framing, decoding and rendering of MB 124 A/C data streams")
+parser.add_argument("paths", help="capture files or directories of captures, default: testdata", nargs="*")
+parser.add_argument("-n", "--synthetic", help="number of packets of synthetic input, 0 for none, default: 100000", type=int, default=100000)
+parser.add_argument("-r", "--render", help="maximum number of packets of each input to render, 0 to skip rendering, default: 5000", type=int, default=5000)
+parser.add_argument("-o", "--output", help="write the results into this JSON file, eg. to be used as a baseline", default="")
+parser.add_argument("-c", "--compare", help="compare the packet rates to this baseline and exit with status 1 on a regression")
+parser.add_argument("-t", "--tolerance", help="slowdown in percent allowed before a regression, default: 20", type=float, default=20)
+args = parser.parse_args()
+
+# The stages are bulk framing of a whole capture ("frame"), framing of
+# a live stream fed one packet worth of bytes at a time ("stream"),
+# decoding of the fields ("decode") and drawing of the decoder display
+# on a pseudo-terminal ("render").
+
+# Every stage is timed twice: first for speed, then once more under
+# tracemalloc for the peak memory use, which would skew the timing.
+
+
+def percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def report(count, seconds, latencies=None, peak=None):
+    """This function returns the results of a stage as a dict, with
+       latencies in microseconds.
+    """
+    result = dict(packets=count, seconds=round(seconds, 6),
+                  packets_per_s=round(count / seconds) if seconds else 0)
+    if latencies:
+        ordered = sorted(latencies)
+        for p in (50, 90, 99):
+            result[f"p{p}_us"] = round(percentile(ordered, p) * 1e6, 2)
+        result["max_us"] = round(ordered[-1] * 1e6, 2)
+    if peak is not None:
+        result["peak_kib"] = round(peak / 1024)
+    return result
+
+
+def traced(stage, *stage_args):
+    """This function returns the peak memory use of a stage in bytes."""
+    tracemalloc.start()
+    stage(*stage_args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def frameBulk(data):
+    return framing.framePackets(data)
+
+
+def frameStream(data):
+    """Framing a live stream one packet worth of bytes at a time."""
+    framer = framing.StreamFramer()
+    latencies = []
+    clock = time.perf_counter
+    for start in range(0, len(data), framing.packet_len):
+        chunk = data[start:start + framing.packet_len]
+        begin = clock()
+        framer.feed(chunk)
+        latencies.append(clock() - begin)
+    return latencies
+
+
+def decode(packets):
+    latencies = []
+    clock = time.perf_counter
+    for number, raw in enumerate(packets):
+        begin = clock()
+        fields.decodePacket(raw, number)
+        latencies.append(clock() - begin)
+    return latencies
+
+
+def benchInput(data):
+    results = {}
+    begin = time.perf_counter()
+    packets = frameBulk(data)
+    results["frame"] = report(len(packets), time.perf_counter() - begin, peak=traced(frameBulk, data))
+    latencies = frameStream(data)
+    results["stream"] = report(len(packets), sum(latencies), latencies, traced(frameStream, data))
+    latencies = decode(packets)
+    results["decode"] = report(len(packets), sum(latencies), latencies, traced(decode, packets))
+    return results
+
+
+def renderChild(filename, count, result_name):
+    """This function runs in a child process with a pseudo-terminal as
+       its terminal and renders packets with the decoder's own drawing
+       functions.
+    """
+    import curses
+    from mb124ac import ui
+
+    def bench(stdscr):
+        ui.initScreen(stdscr)
+        outwin, msgwin = ui.makeWindows(stdscr)
+        latencies = []
+        clock = time.perf_counter
+        with ui.CaptureSource(filename, framing.packet_interval, 0, cache=False) as source:
+            for number in range(min(count, len(source.packets))):
+                begin = clock()
+                packet = fields.decodePacket(source.packets[number], number, source.packets.offsets[number])
+                ui.printPacket(stdscr, outwin, msgwin, packet, source)
+                ui.flushScreen(stdscr, outwin, msgwin, True)
+                latencies.append(clock() - begin)
+        return latencies
+
+    latencies = curses.wrapper(bench)
+    with open(result_name, "w") as result_file:
+        json.dump(latencies, result_file)
+
+
+def benchRender(filename, count):
+    """This function returns the rendering results of a capture, drawn
+       on a 50x130 pseudo-terminal whose output is discarded.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as result_file:
+        result_name = result_file.name
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.environ["TERM"] = "xterm-256color"
+        os.environ["LINES"], os.environ["COLUMNS"] = "50", "130"
+        try:
+            renderChild(filename, count, result_name)
+        finally:
+            os._exit(0)
+    while True:  # drain the terminal until the child is done
+        try:
+            if select.select([fd], [], [], 1.0)[0] and not os.read(fd, 65536):
+                break
+        except OSError:
+            break
+    os.waitpid(pid, 0)
+    os.close(fd)
+    try:
+        with open(result_name) as result_file:
+            latencies = json.load(result_file)
+    except ValueError:
+        latencies = []
+    os.unlink(result_name)
+    return report(len(latencies), sum(latencies), latencies) if latencies else None
+
+
+def compare(results, baseline, tolerance):
+    """This function prints and returns the stages that got slower than
+       the baseline by more than tolerance percent.
+    """
+    regressions = []
+    for name, stages in results["inputs"].items():
+        for stage, result in stages.items():
+            old = baseline.get("inputs", {}).get(name, {}).get(stage)
+            if not old or not old.get("packets_per_s"):
+                continue
+            change = 100 * (result["packets_per_s"] / old["packets_per_s"] - 1)
+            if change < -tolerance:
+                regressions.append((name, stage, change))
+                print(f"REGRESSION {name} {stage}: {old['packets_per_s']} -> {result['packets_per_s']} packets/s ({change:+.1f} %)")
+    return regressions
+
+
+inputs = []
+for filename in framing.expandPaths(args.paths or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "testdata")]):
+    if archive.isArchive(filename):  # framed and decoded like the capture it was made of
+        data = b"".join(archive.Archive(filename).iterSource())
+    else:
+        with open(filename, "rb") as infile:
+            data = infile.read()
+    inputs.append((os.path.basename(filename), filename, data))
+synthetic_name = None
+if args.synthetic:
+    simulator = synth.Simulator(seed=1)
+    data = synth.lead_in + simulator.packets(args.synthetic)
+    with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as synthetic_file:
+        synthetic_file.write(data)
+        synthetic_name = synthetic_file.name
+    inputs.append((f"synthetic-{args.synthetic}", synthetic_name, data))
+
+results = dict(python=platform.python_version(), machine=platform.machine(), columns=len(fields.columns), inputs={})
+print(f"{'input':40s} {'stage':8s} {'packets':>8s} {'packets/s':>10s} {'p50 µs':>8s} {'p99 µs':>8s} {'max µs':>9s} {'peak KiB':>9s}")
+try:
+    for name, filename, data in inputs:
+        stages = benchInput(data)
+        if args.render:
+            rendered = benchRender(filename, args.render)
+            if rendered is not None:
+                stages["render"] = rendered
+        results["inputs"][name] = stages
+        for stage, result in stages.items():
+            print(f"{name:40s} {stage:8s} {result['packets']:8d} {result['packets_per_s']:10d} "
+                  f"{result.get('p50_us', ''):>8} {result.get('p99_us', ''):>8} {result.get('max_us', ''):>9} {result.get('peak_kib', ''):>9}")
+finally:
+    if synthetic_name is not None:
+        os.unlink(synthetic_name)
+
+if args.output != "":
+    with open(args.output, "w") as outfile:
+        json.dump(results, outfile, indent=1)
+
+if args.compare:
+    with open(args.compare) as infile:
+        if compare(results, json.load(infile), args.tolerance):
+            sys.exit(1)
+
+# EOF
@@ -1,46 +1,62 @@
 #!/bin/python3
 import argparse
+import os
+import sys
 
-parser = argparse.ArgumentParser(description="program to hunt bit changes from MB 124 A/C data stream captures",
-                                 epilog="Modify the program to change its function.")
-parser.add_argument("filename", help="name of file read")
-args = parser.parse_args()
-
-sync_bytes = b"\x00\x03\x04\x01\x23\x02\x3b"
-
-with open(args.filename, "rb") as sourcefile:
-    bytesource = sourcefile.read()
-
-firstsync = bytesource.find(sync_bytes) + 7
-length = len(bytesource)
-bytesource = bytesource[firstsync:-((length - firstsync) % 41)]
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
-print(f"Loaded {length} bytes. First packet at {firstsync}, full length after trimming {len(bytesource)}.")
+from mb124ac import archive, fields, framing, index, transitions
 
-index = 1
-bit_status = bytesource[0x1d] & 0b00100000  # temp control mode
-
-while (index * 41) < len(bytesource):
-    
-    print("\nHunting for bit change...")
-    while bit_status == bytesource[0x1d + (index * 41)] & 0b00100000:
-        index += 1
-        if (index * 41) >= len(bytesource):
-            bit_status = -1
-            break
-
-    if bit_status == -1:
-        print("End of file reached.")
-        exit(0)
-
-    index2 = index - 5
-    index += 1
-    bit_status = bytesource[0x1d + (index * 41)] & 0b00100000
+parser = argparse.ArgumentParser(description="program to hunt bit changes from MB 124 A/C data stream captures")
+parser.add_argument("paths", help="capture files or directories of *.bin captures", nargs="+")
+parser.add_argument("-s", "--select", help="field to hunt changes of, as a name, byte/bit or byte&mask, eg. 0x1c&0x60, can be repeated, default: 0x1d/5 (temp control mode)", action="append")
+parser.add_argument("-c", "--context", help="comma separated bytes to print around each change, default: 0x09,0x0a,0x0b and the selected bytes", default="0x09,0x0a,0x0b")
+parser.add_argument("-b", "--before", help="number of packets printed before each change, default: 5", type=int, default=5)
+parser.add_argument("-a", "--after", help="number of packets printed after each change, default: 5", type=int, default=5)
+parser.add_argument("-q", "--quiet", help="only list the changes without context", action="store_true")
+args = parser.parse_args()
 
-    for j in (9, 0xa, 0xb, 0x1d):
-        datastr = f"{j:02x}:"
-        for i in range(index2, index2 + 11):
-            datastr += f" {bytesource[i * 41 + j]:02x}"
-        print(datastr)
+try:
+    selectors = [fields.parseSelector(text) for text in (args.select or ["0x1d/5"])]
+    columns = [fields.parseSelector(text)[0] for text in args.context.split(",") if text]
+except ValueError as error:
+    parser.error(str(error))
+for col, mask in selectors:
+    if col not in columns:
+        columns.append(col)
+
+total = 0
+for filename in framing.expandPaths(args.paths):
+    # an archive is searched from its change records, and only the
+    # packets around each change are decoded for the context
+    if archive.isArchive(filename):
+        packets = archive.Archive(filename)
+        findTransitions = packets.findTransitions
+    else:
+        packets = index.openCapture(filename)
+        findTransitions = lambda col, mask: transitions.findTransitions(packets, col, mask)
+    print(f"{filename}: {len(packets)} packets")
+
+    changes = []
+    for col, mask in selectors:
+        for number, old, new in findTransitions(col, mask):
+            changes.append((number, col, mask, old, new))
+    changes.sort()
+    total += len(changes)
+
+    for number, col, mask, old, new in changes:
+        window, window_first = packets, 0
+        if isinstance(packets, archive.Archive):
+            window_first = max(number - args.before, 0)
+            window = packets.packets(window_first, number + args.after + 1)
+        print(f"\n#{number} @ {window.offsets[number - window_first]}: 0x{col:02x} & 0x{mask:02x}: {old:02x} -> {new:02x}")
+        if args.quiet:
+            continue
+        values, first = transitions.context(window, number - window_first, columns, args.before, args.after)
+        first += window_first
+        for j, data in values.items():
+            print(f"{j:02x}:" + "".join((" >" if first + i == number else "  ") + f"{value:02x}" for i, value in enumerate(data)))
+
+print(f"\n{total} changes found.")
 
 # EOF
@@ -0,0 +1,183 @@
+#!/bin/python3
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import compare, export, fields, framing, index
+
+parser = argparse.ArgumentParser(description="program to compare two MB 124 A/C data stream captures aligned on an anchor",
+                                 epilog="anchors: start, packet=N, time=S, selfcal, selfcal=N (0 for its end), "
+                                 "EVENT[=STATE][#K] for the K-th event named like in tools/events.py, eg. tempmode=1 or circmode#2")
+parser.add_argument("a", help="first capture file")
+parser.add_argument("b", help="second capture file")
+parser.add_argument("-a", "--anchor", help="packet to align the captures on, default: start", default="start")
+parser.add_argument("-b", "--anchor-b", help="anchor of the second capture if different from the first")
+parser.add_argument("-t", "--tolerance", help="raw difference still counted as equal, default: 0", type=int, default=0)
+parser.add_argument("-f", "--fields", help="comma separated data bytes to compare, as names or indexes, default: all")
+parser.add_argument("-d", "--divergences", help="number of divergence points listed per field, default: 4", type=int, default=4)
+parser.add_argument("-o", "--output", help="write the comparison into this file instead of printing it ('-' for standard output)", default="")
+parser.add_argument("-F", "--format", help="format of the output file, default: csv", choices=export.formats, default="csv")
+parser.add_argument("-v", "--view", help="step through the aligned captures side by side", action="store_true")
+args = parser.parse_args()
+
+columns = None
+if args.fields:
+    columns = []
+    for name in args.fields.split(","):
+        try:
+            col, mask = fields.parseSelector(name)
+        except ValueError as error:
+            parser.error(str(error))
+        if mask != 0xff:
+            parser.error(f"{name} selects bits of byte 0x{col:02x}, only whole bytes can be compared")
+        if col not in columns:
+            columns.append(col)
+if columns is not None and any(col >= framing.data_len for col in columns):
+    parser.error("only data bytes 0x00-0x21 can be compared")
+
+capture_a = index.openCapture(args.a)
+capture_b = index.openCapture(args.b)
+try:
+    alignment = compare.alignCaptures(capture_a, capture_b, args.anchor, args.anchor_b)
+except ValueError as error:
+    parser.error(str(error))
+diffs = compare.compareCaptures(alignment, columns, args.tolerance)
+
+
+def duration(packets):
+    sign = "-" if packets < 0 else ""
+    minutes, seconds = divmod(round(abs(packets) * framing.packet_interval), 60)
+    return f"{sign}{minutes}:{seconds:02d}"
+
+
+def formatValue(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def printReport():
+    print(f"A: {args.a}  anchor {args.anchor} at #{alignment.anchor_a}")
+    print(f"B: {args.b}  anchor {args.anchor_b or args.anchor} at #{alignment.anchor_b}")
+    print(f"aligned packets {alignment.first} to {alignment.last - 1} from the anchors, "
+          f"{len(alignment)} packets, {duration(len(alignment))}")
+    print(f"{'byte':4} {'value':22} {'unit':4} {'mean A':>8} {'mean B':>8} {'mean Δ':>8} {'max Δ':>8} {'differ':>7}  divergences")
+    identical = []
+    for diff in diffs:
+        if not diff.differing:
+            identical.append(diff.name)
+            continue
+        points = " ".join(str(point) for point in diff.divergences[:args.divergences])
+        if len(diff.divergences) > args.divergences:
+            points += f" (+{len(diff.divergences) - args.divergences})"
+        print(f"0x{diff.index:02x} {diff.name:22} {diff.unit:4} {diff.mean_a:8.2f} {diff.mean_b:8.2f} "
+              f"{diff.mean_a - diff.mean_b:8.2f} {diff.max_diff:8.2f} {100 * diff.differing / diff.count:6.1f}%  {points}")
+    if identical:
+        print(f"equal: {', '.join(identical)}")
+
+
+def writeReport():
+    writer = export.writeCsv if args.format == "csv" else export.writeJsonl
+    rows = []
+    for diff in diffs:
+        row = dict(a=args.a, b=args.b, anchor_a=alignment.anchor_a, anchor_b=alignment.anchor_b)
+        row.update(diff.asDict())
+        if args.format == "csv":
+            row["divergences"] = " ".join(str(point) for point in diff.divergences)
+        rows.append(row)
+    if args.output == "-":
+        writer(rows, sys.stdout)
+    else:
+        with open(args.output, "w", newline="" if args.format == "csv" else None, encoding="utf-8") as outfile:
+            writer(rows, outfile)
+
+
+def view(stdscr):
+    """This function shows the aligned captures side by side a packet at
+       a time, the values differing beyond the tolerance highlighted.
+    """
+    import curses
+    curses.curs_set(0)
+    curses.start_color()
+    curses.init_pair(1, curses.COLOR_WHITE, curses.COLOR_RED)
+    curses.init_pair(2, curses.COLOR_BLACK, curses.COLOR_YELLOW)
+    shown = diffs
+    position = 0
+    selected = 0
+    playing = False
+    stdscr.timeout(round(1000 * framing.packet_interval))
+    while True:
+        number_a, number_b = alignment.numbers(position)
+        packet_a = fields.decodePacket(capture_a[number_a], number_a)
+        packet_b = fields.decodePacket(capture_b[number_b], number_b)
+        height, width = stdscr.getmaxyx()
+        half = width // 2
+        stdscr.erase()
+        try:
+            stdscr.addnstr(0, 0, f"{position:+d} ({duration(position)}) of {alignment.first}..{alignment.last - 1}"
+                           f"{'  playing' if playing else ''}", width - 1, curses.A_BOLD)
+            stdscr.addnstr(1, 0, f"A #{number_a} {os.path.basename(args.a)}", half - 1)
+            stdscr.addnstr(1, half, f"B #{number_b} {os.path.basename(args.b)}", width - half - 1)
+            for row, diff in enumerate(shown[:height - 3]):
+                raw_a = packet_a.ints[diff.index]
+                raw_b = packet_b.ints[diff.index]
+                value_a = packet_a.engineering(diff.index)
+                value_b = packet_b.engineering(diff.index)
+                label = f"{diff.name:22} {formatValue(value_a):>8} {diff.unit}"
+                attribute = curses.A_REVERSE if row == selected else curses.A_NORMAL
+                stdscr.addnstr(row + 2, 0, label, half - 1, attribute)
+                if abs(raw_a - raw_b) > args.tolerance:
+                    attribute |= curses.color_pair(1)
+                elif raw_a != raw_b:
+                    attribute |= curses.color_pair(2)
+                delta = value_a - value_b
+                stdscr.addnstr(row + 2, half, f"{formatValue(value_b):>8} {diff.unit:4} {'' if not delta else formatValue(delta):>8}",
+                               width - half - 1, attribute)
+            stdscr.addnstr(height - 1, 0, "h/j/k/l seek  space play  up/down field  n/p next/previous divergence  a anchor  q quit",
+                           width - 1)
+        except curses.error:
+            pass
+        stdscr.refresh()
+        key = stdscr.getch()
+        if key == -1:
+            if playing:
+                position = min(position + 1, alignment.last - 1)
+                playing = position < alignment.last - 1
+            continue
+        if key == ord('q'):
+            break
+        if key == ord('h'):
+            position -= 60
+        elif key == ord('j'):
+            position -= 10
+        elif key == ord('k'):
+            position += 10
+        elif key == ord('l'):
+            position += 60
+        elif key == ord(' '):
+            playing = not playing
+        elif key == curses.KEY_UP:
+            selected = max(selected - 1, 0)
+        elif key == curses.KEY_DOWN:
+            selected = min(selected + 1, len(shown) - 1, height - 4)
+        elif key == ord('n'):  # next divergence of the selected field
+            position = next((point for point in shown[selected].divergences if point > position), position)
+        elif key == ord('p'):  # previous divergence of the selected field
+            position = next((point for point in reversed(shown[selected].divergences) if point < position), position)
+        elif key == ord('a'):  # back to the anchor
+            position = 0
+        position = min(max(position, alignment.first), alignment.last - 1)
+
+
+if not len(alignment):
+    parser.error("the captures don't overlap around the anchors")
+if args.view:
+    import curses
+    curses.wrapper(view)
+elif args.output != "":
+    writeReport()
+else:
+    printReport()
+
+# EOF
@@ -0,0 +1,26 @@
+#!/bin/python3
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import archive
+
+parser = argparse.ArgumentParser(description="program to convert MB 124 A/C data stream captures into compressed archives and back")
+parser.add_argument("input", help="capture (*.bin) to archive, or archive (*.mba) to extract")
+parser.add_argument("output", help="name of the archive or the extracted capture")
+parser.add_argument("-n", "--chunk", help=f"number of packets between keyframes, default: {archive.default_chunk_len}", type=int, default=archive.default_chunk_len)
+parser.add_argument("-c", "--compression", help="compression of the archive, default: zlib", choices=archive.compressions, default="zlib")
+args = parser.parse_args()
+
+if args.chunk < 1:
+    parser.error("the chunk length must be at least 1")
+
+if archive.isArchive(args.input):
+    archive.extractArchive(args.input, args.output)
+else:
+    archive.writeArchive(args.input, args.output, args.chunk, args.compression)
+print(f"{args.input} ({os.path.getsize(args.input)} bytes) -> {args.output} ({os.path.getsize(args.output)} bytes)")
+
+# EOF
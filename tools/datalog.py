@@ -1,36 +1,75 @@
 #!/bin/python3
 
 import argparse
+import os
 import serial
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import framing, logwriter, timestamps
+
 parser = argparse.ArgumentParser(description="log serial data on disk while printing it to console in hexadecimal")
 parser.add_argument("-f", "--file", help="name of file to store logged data into (if omitted, data is only echoed to console)", default="")
 parser.add_argument("-l", "--recordlen", help="length in bytes of each printed line to console (doesn't affect data stored into file), default: 41", type=int, default=41)
 parser.add_argument("-t", "--timeout", help="time in seconds to wait after data stream stops before ending datalogging, default: 30", type=float, default=30)
 parser.add_argument("-p", "--port", help="serial port to log data from, default: /dev/ttyUSB0", default="/dev/ttyUSB0")
 parser.add_argument("-b", "--baudrate", help="data rate in bits per second, default: 4800", type=int, default=4800)
+parser.add_argument("-a", "--aligned", help="frame packets on the fly, print one packet per line and store the arrival time of each packet into <file>.ts", action="store_true")
+parser.add_argument("-s", "--sync", help="interval in seconds of forcing logged data onto the disk, 0 to leave it to the OS, default: 10", type=float, default=10)
 args = parser.parse_args()
 
+# The loop below only reads the port and queues everything else, the
+# writer threads take care of the file and the console.
+
 with serial.Serial(args.port, args.baudrate, timeout=2.0) as port:
     print(f"Reading from {args.port} @ {args.baudrate} bps.")
+    console = logwriter.LogWriter(sys.stdout.buffer, 0.2, 0)
+    recorder = None
     if (args.file != ""):
-        with open(args.file, "wb") as outFile:
-            print(f"Writing to {args.file}.")
-            bytecounter = 0
-            timestamp = time.time()
-            while (time.time() <= timestamp + args.timeout):
-                dataBuffer = port.read(args.recordlen)
-                if dataBuffer:
-                    print(f"{bytecounter:8x}: " + dataBuffer.hex(" ", -2))
-                    bytecounter += outFile.write(dataBuffer)
-                    timestamp = time.time()
-    else:
+        recorder = logwriter.Recorder(args.file, stamps=args.aligned, sync_interval=args.sync)
+        print(f"Writing to {args.file}.")
+        if args.aligned:
+            print(f"Writing packet timestamps to {timestamps.timestampName(args.file)}.")
+    framer = framing.StreamFramer()
+
+    try:
         bytecounter = 0
         timestamp = time.time()
         while (time.time() <= timestamp + args.timeout):
-            dataBuffer = port.read(args.recordlen)
-            if dataBuffer:
-                print(f"{bytecounter:8x}: " + dataBuffer.hex(" ", -2))
-                bytecounter += len(dataBuffer)
-                timestamp = time.time()
+            if args.aligned:
+                dataBuffer = port.read(port.in_waiting or 1)
+            else:
+                dataBuffer = port.read(args.recordlen)
+            if not dataBuffer:
+                continue
+            monotonic_ns = time.monotonic_ns()
+            wall_ns = time.time_ns()
+            if recorder is not None:
+                recorder.data(dataBuffer)
+            if args.aligned:
+                for offset, packet in framer.feed(dataBuffer):
+                    if recorder is not None:
+                        recorder.packet(offset, packet, monotonic_ns, wall_ns)
+                    clock = time.strftime("%H:%M:%S", time.localtime(wall_ns / 1e9))
+                    console.write(f"{clock} {offset:8x}: {packet.hex(' ', -2)}\n".encode())
+            else:
+                console.write(f"{bytecounter:8x}: {dataBuffer.hex(' ', -2)}\n".encode())
+            bytecounter += len(dataBuffer)
+            timestamp = time.time()
+            if (recorder is not None) and (recorder.error() is not None):
+                raise recorder.error()
+            if console.error is not None:
+                raise console.error
+    except KeyboardInterrupt:
+        pass
+    finally:
+        console.close()
+        if recorder is not None:
+            recorder.close()
+
+    if args.aligned:
+        print(f"{bytecounter} bytes, {framer.stats.describe()}.")
+
+# EOF
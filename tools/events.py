@@ -0,0 +1,37 @@
+#!/bin/python3
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import events, export, framing
+
+parser = argparse.ArgumentParser(description="program to list controller state changes in MB 124 A/C data stream captures")
+parser.add_argument("paths", help="capture files or directories of *.bin captures", nargs="+")
+parser.add_argument("-n", "--name", help="event type to list, can be repeated, default: all", choices=events.event_names, action="append")
+parser.add_argument("-o", "--output", help="write the events into this file instead of listing them ('-' for standard output)", default="")
+parser.add_argument("-F", "--format", help="format of the output file, default: csv", choices=export.formats, default="csv")
+args = parser.parse_args()
+
+rows = []  # (filename, event) tuples for the output file
+for filename in framing.expandPaths(args.paths):
+    found = events.captureEvents(filename, args.name)
+    if args.output != "":
+        rows.extend((filename, event) for event in found)
+        continue
+    print(f"{filename}: {len(found)} events")
+    for event in found:
+        minutes, seconds = divmod(event.time, 60)
+        print(f"  #{event.number:<6d} @ {event.offset:8d} {int(minutes):4d}:{seconds:04.1f}  {event.message}")
+
+if args.output != "":
+    writer = export.writeCsv if args.format == "csv" else export.writeJsonl
+    rows = (dict(file=filename) | event.asDict() for filename, event in rows)
+    if args.output == "-":
+        writer(rows, sys.stdout)
+    else:
+        with open(args.output, "w", newline="" if args.format == "csv" else None, encoding="utf-8") as outfile:
+            writer(rows, outfile)
+
+# EOF
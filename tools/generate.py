@@ -0,0 +1,82 @@
+#!/bin/python3
+import argparse
+import os
+import pty
+import sys
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import framing, replay, synth
+
+
+def byteCount(text):
+    """This function returns a size like 500K, 20M or 1G in bytes."""
+    multipliers = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if text[-1:].upper() in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1:].upper()])
+    return int(text)
+
+
+parser = argparse.ArgumentParser(description="program to generate synthetic MB 124 A/C data streams for testing")
+parser.add_argument("-o", "--output", help="file to write the data stream into, '-' for standard output, default: -", default="-")
+parser.add_argument("-n", "--packets", help="number of packets to generate, default: one hour worth", type=int)
+parser.add_argument("-S", "--size", help="generate this many bytes instead, eg. 1G")
+parser.add_argument("-t", "--pty", help="feed the data stream to a pseudo-terminal instead of a file and print its name", action="store_true")
+parser.add_argument("-s", "--speed", help="speed multiplier of the data rate to a pseudo-terminal, 0 for as fast as possible, default: 1", type=float, default=1)
+parser.add_argument("--seed", help="seed of the random numbers, for repeatable data", type=int)
+parser.add_argument("--exterior", help="exterior temperature in °C, default: 20", type=float, default=20)
+parser.add_argument("--dial", help="initial temperature dial setting in °C, default: 22", type=float, default=22)
+parser.add_argument("--drop", help="probability of a packet missing a byte, default: 0", type=float, default=0)
+parser.add_argument("--insert", help="probability of a packet having an extra byte, default: 0", type=float, default=0)
+parser.add_argument("--sync", help="probability of a packet having a wrong sync byte, default: 0", type=float, default=0)
+args = parser.parse_args()
+
+try:
+    replay.checkSpeed(args.speed)
+except ValueError as error:
+    parser.error(str(error))
+
+count = args.packets
+if args.size is not None:
+    count = byteCount(args.size) // framing.packet_len
+elif count is None:
+    count = round(3600 / framing.packet_interval)
+
+simulator = synth.Simulator(args.seed, args.exterior, dial=args.dial)
+corruptor = synth.Corruptor(args.drop, args.insert, args.sync, args.seed)
+
+
+def iterBlocks(block=1000):
+    """This function yields the data stream in blocks of packets."""
+    yield synth.lead_in
+    for first in range(0, count, block):
+        yield b"".join(corruptor.apply(simulator.packet()) for _ in range(min(block, count - first)))
+
+
+if args.pty:
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    print(os.ttyname(slave), flush=True)
+    clock = replay.ReplayClock(framing.packet_interval, args.speed)
+    os.write(master, synth.lead_in)
+    try:
+        for number in range(count):
+            while not clock.wait(number, 1.0):
+                pass
+            data = corruptor.apply(simulator.packet())
+            while data:  # the pty buffer may only take part of it
+                data = data[os.write(master, data):]
+    except KeyboardInterrupt:
+        pass
+elif args.output == "-":
+    for data in iterBlocks():
+        sys.stdout.buffer.write(data)
+else:
+    with open(args.output, "wb") as outfile:
+        for data in iterBlocks():
+            outfile.write(data)
+
+print(f"{count} packets, {corruptor.damaged} damaged.", file=sys.stderr)
+
+# EOF
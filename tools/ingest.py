@@ -0,0 +1,111 @@
+#!/bin/python3
+import argparse
+import asyncio
+import csv
+import json
+import os
+import stat
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import events, export, fields, ingest, logwriter, replay
+
+parser = argparse.ArgumentParser(description="program to follow several MB 124 A/C data streams at once")
+parser.add_argument("sources", help="serial ports and/or capture files", nargs="+")
+parser.add_argument("-b", "--baudrate", help="serial data rate in bits per second, default: 4800", type=int, default=4800)
+parser.add_argument("-s", "--speed", help="replay speed multiplier of capture files, 0 for as fast as possible, default: 1", type=float, default=1)
+parser.add_argument("-o", "--output", help="store the decoded packets of all sources into this file, one row per packet with the source name", default="")
+parser.add_argument("-F", "--format", help="format of the output file, default: csv", choices=export.formats, default="csv")
+parser.add_argument("-r", "--record", help="record the data stream of each serial port into <name>.bin in this directory", default="")
+parser.add_argument("-i", "--interval", help="seconds between status lines, default: 5", type=float, default=5)
+args = parser.parse_args()
+
+try:
+    replay.checkSpeed(args.speed)
+except ValueError as error:
+    parser.error(str(error))
+
+
+class TextWriter:
+    """Text file interface to a LogWriter, for the csv module."""
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, text):
+        self.writer.write(text.encode("utf-8"))
+
+
+def say(text):
+    """This function queues a line for standard output, so that a slow
+       terminal or pipe never stalls the event loop.
+    """
+    console.write((text + "\n").encode("utf-8"))
+
+
+def openSources():
+    sources = []
+    for path, name in zip(args.sources, ingest.sourceNames(args.sources)):
+        if stat.S_ISCHR(os.stat(path).st_mode):  # a serial port
+            import serial
+            recorder = None
+            if args.record != "":
+                recorder = logwriter.Recorder(os.path.join(args.record, name.replace("/", "_") + ".bin"))
+            sources.append(ingest.SerialSource(name, serial.Serial(path, args.baudrate, timeout=0), recorder))
+        else:
+            sources.append(ingest.FileSource(name, path, speed=args.speed))
+    return sources
+
+
+def consume(source, packet):
+    """This function stores a packet and prints the events it causes."""
+    latest[source.name] = packet
+    for event in trackers[source.name].update(packet, time.time()):
+        say(time.strftime("%H:%M:%S") + f" {source.name}: {event.message}")
+    if csv_rows is not None:
+        csv_rows.writerow([source.name, packet.number, packet.offset] + list(packet.values))
+    elif output is not None:
+        text.write(json.dumps(dict(source=source.name, packet=packet.number, offset=packet.offset) | packet.asDict(),
+                              ensure_ascii=False) + "\n")
+
+
+def printStatus():
+    for source in sources:
+        packet = latest.get(source.name)
+        if packet is None:
+            say(f"{source.name}: waiting for data")
+            continue
+        say(f"{source.name}: #{packet.number} dropped: {source.dropped()} bytes  "
+              f"interior: {packet.interior_c:5.1f}°C  exterior: {packet.exterior_c:5.1f}°C  "
+              f"targets: {packet.target_left_c:4.1f}/{packet.target_right_c:4.1f}°C  "
+              f"compressor: {'on' if packet.compressor else 'off'}")
+
+
+console = logwriter.LogWriter(sys.stdout.buffer, flush_interval=0.2, sync_interval=0)
+sources = openSources()
+trackers = {source.name: events.EventTracker() for source in sources}
+latest = {}   # the latest decoded packet of each source
+output = text = csv_rows = None
+if args.output != "":
+    output = logwriter.LogWriter(open(args.output, "wb"))
+    text = TextWriter(output)
+    if args.format == "csv":
+        csv_rows = csv.writer(text)
+        csv_rows.writerow(["source", "packet", "offset"] + list(fields.columns))
+
+try:
+    asyncio.run(ingest.ingest(sources, consume, printStatus, args.interval))
+except KeyboardInterrupt:
+    pass
+finally:
+    printStatus()
+    console.close()
+    if output is not None:
+        output.close()
+        output.outfile.close()
+    for source in sources:
+        if getattr(source, "recorder", None) is not None:
+            source.recorder.close()
+
+# EOF
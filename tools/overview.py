@@ -0,0 +1,62 @@
+#!/bin/python3
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import fields, framing, pyramid
+
+parser = argparse.ArgumentParser(description="program to show the trend of data values over a whole MB 124 A/C data stream capture")
+parser.add_argument("paths", help="capture files or directories of *.bin captures", nargs="+")
+parser.add_argument("-f", "--fields", help="comma separated data bytes to show, as names or indexes, default: heater_left,duty_left", default="heater_left,duty_left")
+parser.add_argument("-n", "--points", help="maximum number of rows per field, default: 40", type=int, default=40)
+parser.add_argument("-r", "--range", help="packets to show as first:last, eg. 600:1200, default: all", default=":")
+parser.add_argument("-w", "--width", help="width of the min-max bars in characters, default: 50", type=int, default=50)
+parser.add_argument("--no-cache", help="don't write the summary pyramids beside the captures", action="store_true")
+args = parser.parse_args()
+
+try:
+    columns = [fields.parseSelector(name)[0] for name in args.fields.split(",")]
+    first, _, last = args.range.partition(":")
+    first = int(first) if first else 0
+    last = int(last) if last else None
+except ValueError as error:
+    parser.error(str(error))
+if any(col >= len(fields.fields) for col in columns):
+    parser.error("only data bytes 0x00-0x21 can be shown")
+
+
+def engineering(field, value):
+    return field.convert(value) if field.convert is not None else value
+
+
+def bar(low, high, mean, lowest, highest):
+    """This function returns a bar from low to high with the mean marked,
+       scaled from lowest to highest.
+    """
+    scale = (args.width - 1) / max(highest - lowest, 1)
+    line = [" "] * args.width
+    for pos in range(round((low - lowest) * scale), round((high - lowest) * scale) + 1):
+        line[pos] = "-"
+    line[round((mean - lowest) * scale)] = "|"
+    return "".join(line)
+
+
+for filename in framing.expandPaths(args.paths):
+    summary = pyramid.loadPyramid(filename, not args.no_cache)
+    print(f"{filename}: {summary.packets} packets")
+    for col in columns:
+        field = fields.fields[col]
+        rows = summary.overview(col, first, last if last is not None else summary.packets, args.points)
+        if not rows:
+            continue
+        lowest = min(row[1] for row in rows)
+        highest = max(row[2] for row in rows)
+        print(f"  0x{col:02x} {field.name} {field.unit}")
+        for number, low, high, mean in rows:
+            minutes, seconds = divmod(round(number * framing.packet_interval), 60)
+            print(f"  #{number:<6d} {minutes:4d}:{seconds:02d} {engineering(field, low):8.2f} {engineering(field, mean):8.2f} "
+                  f"{engineering(field, high):8.2f}  {bar(low, high, mean, lowest, highest)}")
+
+# EOF
@@ -0,0 +1,56 @@
+#!/bin/python3
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import export, fields, framing, query
+
+parser = argparse.ArgumentParser(description="program to find the packets matching a query in MB 124 A/C data stream captures",
+                                 epilog="example: %(prog)s 'heater_left > 200 and compressor' testdata")
+parser.add_argument("query", help="expression of the values named in the decoded output, eg. 'interior_c < 18 and not recirc_100', "
+                    "byte(i) and bit(i, n) for raw data bytes", nargs="?")
+parser.add_argument("paths", help="capture files or directories of *.bin captures", nargs="*")
+parser.add_argument("-c", "--count", help="only print the number of matching packets of each capture", action="store_true")
+parser.add_argument("-j", "--jobs", help="number of worker processes, default: number of CPUs", type=int)
+parser.add_argument("-o", "--output", help="write the matches into this file instead of listing them ('-' for standard output)", default="")
+parser.add_argument("-F", "--format", help="format of the output file, default: csv", choices=export.formats, default="csv")
+parser.add_argument("-l", "--list-fields", help="list the names usable in queries and exit", action="store_true")
+args = parser.parse_args()
+
+if args.list_fields:
+    print(" ".join(fields.columns))
+    sys.exit(0)
+if (args.query is None) or not args.paths:
+    parser.error("a query and at least one capture are needed")
+
+try:
+    query.Query(args.query)
+except ValueError as error:
+    parser.error(str(error))
+
+rows = []  # (filename, packet number, offset) tuples for the output file
+total = 0
+for filename, matches in query.queryFiles(framing.expandPaths(args.paths), args.query, args.jobs):
+    total += len(matches)
+    if args.output != "":
+        rows.extend((filename, number, offset) for number, offset in matches)
+    elif args.count:
+        print(f"{len(matches):8d}  {filename}")
+    else:
+        for number, offset in matches:
+            print(f"{filename}  #{number:<6d} @ {offset:8d}")
+
+if args.output != "":
+    writer = export.writeCsv if args.format == "csv" else export.writeJsonl
+    rows = (dict(file=filename, packet=number, offset=offset) for filename, number, offset in rows)
+    if args.output == "-":
+        writer(rows, sys.stdout)
+    else:
+        with open(args.output, "w", newline="" if args.format == "csv" else None, encoding="utf-8") as outfile:
+            writer(rows, outfile)
+elif args.count:
+    print(f"{total:8d}  in total")
+
+# EOF
@@ -1,65 +1,79 @@
 #!/bin/python3
 import argparse
-
-parser = argparse.ArgumentParser(description="program to hunt minimum and maximum data values from MB 124 A/C data stream captures",
-                                 epilog="Modify the program to change its function.")
-parser.add_argument("filename", help="name of file read")
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import fields, framing, stats
+
+parser = argparse.ArgumentParser(description="program to hunt minimum, maximum and other statistics of data values from MB 124 A/C data stream captures")
+parser.add_argument("paths", help="capture files or directories of *.bin captures", nargs="+")
+parser.add_argument("-f", "--fields", help="comma separated data bytes to report, as names or indexes, default: all")
+parser.add_argument("-p", "--percentiles", help="comma separated percentiles to report, default: 5,50,95", default="5,50,95")
+parser.add_argument("-z", "--skip-zero", help="ignore raw zero values of the timers and counters that are 0 when inactive "
+                    "(selfcal_timer, overheat, recirc_timer, adjust_timer_left, adjust_timer_right)", action="store_true")
+parser.add_argument("--zero-fields", help="comma separated data bytes whose zero values -z ignores instead, as names or indexes")
+parser.add_argument("-H", "--histogram", help="print the full histogram of each reported byte", action="store_true")
+parser.add_argument("-j", "--jobs", help="number of worker processes, default: number of CPUs", type=int)
+parser.add_argument("--json", help="write the report as JSON into this file", default="")
 args = parser.parse_args()
 
-sync_bytes = b"\x00\x03\x04\x01\x23\x02\x3b"
-
-with open(args.filename, "rb") as sourcefile:
-    bytesource = sourcefile.read()
-
-firstsync = bytesource.find(sync_bytes) + 7
-length = len(bytesource)
-bytesource = bytesource[firstsync:-((length - firstsync) % 41)]
-
-print(f"Loaded {length} bytes. First packet at {firstsync}, full length after trimming {len(bytesource)}.")
-
-index = 0
-
-AdjDampLMin = 255
-AdjDampLMax = 0
-AdjDampRMin = 255
-AdjDampRMax = 0
-ExtBiasMin = +127
-ExtBiasMax = -128
-
-print("\nHunting...\n")
-
-while (index * 41) < len(bytesource):
-    offset = index * 41 + 0xb
-    ExtBias = int.from_bytes(bytesource[offset:offset + 1], signed=True)
-    if ExtBias > ExtBiasMax:
-        ExtBiasMax = ExtBias
-    if ExtBias < ExtBiasMin:
-        ExtBiasMin = ExtBias
-
-    offset = index * 41 + 0x1f
-    AdjDampL = int.from_bytes(bytesource[offset:offset + 1], signed=False)
-    if AdjDampL:
-        if AdjDampL > AdjDampLMax:
-            AdjDampLMax = AdjDampL
-        if AdjDampL < AdjDampLMin:
-            AdjDampLMin = AdjDampL
-
-    offset = index * 41 + 0x21
-    AdjDampR = int.from_bytes(bytesource[offset:offset + 1], signed=False)
-    if AdjDampR:
-        if AdjDampR > AdjDampRMax:
-            AdjDampRMax = AdjDampR
-        if AdjDampR < AdjDampRMin:
-            AdjDampRMin = AdjDampR
-
-    index += 1
-
-print(f"External temp bias min/max: {ExtBiasMin:4d} / {ExtBiasMax:4d}")
-
-if AdjDampLMax:
-    print(f"Left adjustment damping min/max: {AdjDampLMin:3d} / {AdjDampLMax:3d}")
 
-if AdjDampRMax:
-    print(f"Right adjustment damping min/max: {AdjDampRMin:3d} / {AdjDampRMax:3d}")
+def selectColumns(text):
+    """This function returns the data bytes of a comma separated list of
+       names or indexes, each once, in the order first given.
+    """
+    columns = []
+    for name in text.split(","):
+        try:
+            col, mask = fields.parseSelector(name)
+        except ValueError as error:
+            parser.error(str(error))
+        if mask != 0xff:
+            parser.error(f"{name} selects bits of byte 0x{col:02x}, only whole bytes can be reported")
+        if col >= len(fields.fields):
+            parser.error("only data bytes 0x00-0x21 can be reported")
+        if col not in columns:
+            columns.append(col)
+    return columns
+
+
+try:
+    percentiles = [float(p) for p in args.percentiles.split(",")]
+except ValueError as error:
+    parser.error(str(error))
+if not all(0 <= p <= 100 for p in percentiles):
+    parser.error("percentiles must be between 0 and 100")
+columns = selectColumns(args.fields) if args.fields else list(range(len(fields.fields)))
+skip_zero = selectColumns(args.zero_fields) if args.zero_fields else stats.idle_zero_fields
+
+filenames = framing.expandPaths(args.paths)
+counts, histograms = stats.corpusHistograms(filenames, args.jobs)
+
+for filename, count in counts.items():
+    print(f"{count:8d} packets  {filename}")
+print(f"{sum(counts.values()):8d} packets in {len(counts)} files\n")
+
+print("byte name                   count     min     max     mean" + "".join(f"  {'p' + format(p, 'g'):>6s}" for p in percentiles))
+report = {}
+for col in columns:
+    result = stats.summary(col, histograms[col], percentiles, args.skip_zero and (col in skip_zero))
+    name = fields.fields[col].name
+    report[name] = dict(index=col, summary=result, histogram=histograms[col])
+    if result is None:
+        print(f"0x{col:02x} {name:20s}       0")
+        continue
+    line = f"0x{col:02x} {name:20s} {result['count']:7d} {result['min']:+7d} {result['max']:+7d} {result['mean']:+8.2f}"
+    line += "".join(f"  {result['p' + format(p, 'g')]:+6d}" for p in percentiles)
+    print(line)
+    if args.histogram:
+        for value, count in stats.orderedBins(col, histograms[col], args.skip_zero and (col in skip_zero)):
+            print(f"        {value:+5d}: {count}")
+
+if args.json != "":
+    with open(args.json, "w") as outfile:
+        json.dump(dict(files=counts, fields=report), outfile, indent=1)
 
 # EOF
@@ -0,0 +1,100 @@
+#!/bin/python3
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mb124ac import fields, publish, synth
+
+parser = argparse.ArgumentParser(description="program to print packets published by decoder.py -P",
+                                 epilog="--self-check publishes synthetic packets on localhost to two clients, one of them "
+                                 "not reading at all, and checks that the other one gets every packet and the stalled "
+                                 "one loses only its oldest ones")
+parser.add_argument("address", help="address of the publisher as host:port, :port or a Unix socket path", nargs="?")
+parser.add_argument("-f", "--fields", help="comma separated values to print of each packet, eg. interior_c,compressor (default: the whole message)", default="")
+parser.add_argument("-r", "--raw", help="print only the raw packets in hexadecimal", action="store_true")
+parser.add_argument("--self-check", help="check the fan-out and drop-oldest behaviour of the publisher on localhost and exit",
+                    action="store_true")
+parser.add_argument("-n", "--count", help="number of packets published by --self-check, default: 5000", type=int, default=5000)
+args = parser.parse_args()
+
+
+def readNumbers(conn, numbers):
+    """This function appends the packet number of every message read
+       from conn to numbers until the connection is closed.
+    """
+    for line in conn.makefile("r", encoding="utf-8"):
+        numbers.append(json.loads(line)["packet"])
+
+
+def selfCheck(count):
+    """This function returns True if a publisher on localhost passes
+       every packet to a client that keeps up and drops only the oldest
+       queued packets of a client that doesn't read at all.
+    """
+    publisher = publish.Publisher("127.0.0.1:0", maxsize=64)
+    address = publisher.server.getsockname()
+    fast = socket.create_connection(address)
+    stalled = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stalled.connect(address)
+    fast_numbers = []
+    stalled_numbers = []
+    reader = threading.Thread(target=readNumbers, args=(fast, fast_numbers), daemon=True)
+    reader.start()
+    deadline = time.monotonic() + 5
+    while (len(publisher.clients()) < 2) and (time.monotonic() < deadline):
+        time.sleep(0.01)
+    subscribers = publisher.clients()
+    simulator = synth.Simulator(seed=1)
+    for number in range(count):
+        publisher.publish(fields.decodePacket(simulator.packet(), number), time.time())
+        time.sleep(0.0001)  # about the pace a fast replay publishes at
+    publisher.close()
+    reader.join(10)
+    readNumbers(stalled, stalled_numbers)
+    dropped = sum(subscriber.dropped for subscriber in subscribers)
+    fast.close()
+    stalled.close()
+    checks = (("both clients connected", len(subscribers) == 2),
+              (f"the reading client got all {count} packets in order", fast_numbers == list(range(count))),
+              (f"the stalled client lost {dropped} packets", dropped > 0),
+              ("the stalled client got the newest packet", stalled_numbers[-1:] == [count - 1]),
+              ("the stalled client lost only whole packets, oldest first",
+               stalled_numbers == sorted(stalled_numbers) and len(stalled_numbers) + dropped == count))
+    for text, passed in checks:
+        print(f"{'ok  ' if passed else 'FAIL'}  {text}")
+    return all(passed for text, passed in checks)
+
+
+if args.self_check:
+    sys.exit(0 if selfCheck(args.count) else 1)
+if args.address is None:
+    parser.error("the address of the publisher is required")
+
+try:
+    family, address = publish.parseAddress(args.address)
+except ValueError as error:
+    parser.error(str(error))
+names = [name for name in args.fields.split(",") if name]
+
+with socket.socket(family, socket.SOCK_STREAM) as conn:
+    conn.connect(address)
+    try:
+        for line in conn.makefile("r", encoding="utf-8"):
+            if args.raw:
+                print(json.loads(line)["raw"])
+            elif names:
+                row = json.loads(line)
+                print(f"#{row['packet']}: " + "  ".join(f"{name}={row.get(name)}" for name in names))
+            else:
+                print(line, end="")
+    except KeyboardInterrupt:
+        pass
+
+# EOF